@@ -0,0 +1,44 @@
+"""Reading a field: `c.<field>` vs. a frozen snapshot (clima.freeze()) vs. a local variable
+
+    python benchmarks/attribute_access.py [reads]
+"""
+import os
+import sys
+import timeit
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def main(reads=1_000_000):
+    from clima import c, freeze, Schema
+
+    class Conf(Schema):
+        threshold: int = 10
+        name: str = 'name'
+
+    sys.argv = ['tool', 'x']
+
+    @c
+    class Cli:
+        def x(self):
+            pass
+
+    conf = freeze()
+    threshold = conf.threshold
+    variants = {
+        'c.threshold': lambda: c.threshold,
+        'freeze().threshold': lambda: conf.threshold,
+        'local variable': lambda: threshold,
+    }
+
+    print(f'{reads} reads, best of 5')
+    for name, read in variants.items():
+        elapsed = min(timeit.repeat(read, number=reads, repeat=5))
+        print(f'  {name:<20} {elapsed * 1e9 / reads:8.1f} ns/read')
+
+
+if __name__ == '__main__':
+    os.environ['CLIMA_NO_CACHE'] = '1'
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,96 @@
+"""Casting cost per invocation vs. the number of fields
+
+Compares casting every value of a schema with the generic cast (should_wrap_as_list checks and calling the
+annotation on each cast) three times, as the values used to be cast (cli arguments, the chained layers and
+after post_init), with casting each value once with the fields' compiled casters. Also measures a whole
+invocation reading every field from the environment.
+
+    python benchmarks/casting.py [rounds]
+"""
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+TYPES = [(int, '1'), (str, 'x'), (bool, 'false'), (list, 'item'), (Path, '/tmp')]
+
+
+def measure(fn, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def generic_cast(annotation, value):
+    from clima.schema import should_wrap_as_list
+    if should_wrap_as_list(value, annotation):
+        return annotation([value])
+    return annotation(value)
+
+
+def define_schema(n_fields):
+    from clima import Schema
+
+    namespace = {'__annotations__': {}}
+    values = {}
+    for i in range(n_fields):
+        annotation, value = TYPES[i % len(TYPES)]
+        namespace['__annotations__'][f'field_{i}'] = annotation
+        namespace[f'field_{i}'] = annotation() if annotation is not Path else Path('.')
+        values[f'field_{i}'] = value
+
+    return type(f'Schema{n_fields}', (Schema,), namespace), values
+
+
+def invocation(schema_cls, values):
+    from clima import c
+
+    def run():
+        # Registers a fresh instance of the schema as the configuration
+        schema_cls._wrap(schema_cls)
+        sys.argv = ['tool', 'x']
+
+        @c
+        class Cli:
+            def x(self):
+                for field in values:
+                    getattr(c, field)
+
+    return run
+
+
+def main(rounds=20):
+    from clima import schema
+
+    os.environ['CLIMA_NO_CACHE'] = '1'
+    print(f'median of {rounds} rounds')
+    print(f'{"fields":>8} {"generic x3":>12} {"compiled x1":>12} {"invocation":>12}')
+    for n_fields in (10, 100, 1000):
+        schema_cls, values = define_schema(n_fields)
+        registry = schema.fields(schema_cls)
+
+        def generic():
+            for _ in range(3):
+                for name, value in values.items():
+                    generic_cast(registry[name].annotation, value)
+
+        def compiled():
+            schema.cast_fields(registry, values)
+
+        with mock.patch.dict(os.environ, values), mock.patch('sys.stdin.isatty', return_value=True):
+            elapsed_invocation = measure(invocation(schema_cls, values), rounds)
+
+        print(f'{n_fields:>8} {measure(generic, rounds) * 1000:>10.2f}ms {measure(compiled, rounds) * 1000:>10.2f}ms'
+              f' {elapsed_invocation * 1000:>10.2f}ms')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,53 @@
+"""Environment layer: filtering the whole environment vs. looking up each field
+
+    python benchmarks/environment_lookup.py [environment variables] [fields] [rounds]
+"""
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def measure(fn, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main(n_variables=1000, n_fields=200, rounds=20):
+    from clima import Schema, env, utils
+
+    fields = {f'field_{i}': '' for i in range(n_fields)}
+    Conf = type('Conf', (Schema,), fields)
+    Prefixed = type('Prefixed', (Schema,), dict(fields), env_prefix='MYTOOL_')
+
+    # Every tenth field is defined, the rest of the environment is noise
+    environ = {f'CI_VARIABLE_{i}': 'x' for i in range(n_variables - 2 * len(range(0, n_fields, 10)))}
+    environ.update({f'field_{i}': 'y' for i in range(0, n_fields, 10)})
+    environ.update({f'MYTOOL_FIELD_{i}': 'y' for i in range(0, n_fields, 10)})
+
+    with mock.patch.dict(os.environ, environ, clear=True):
+        conf, prefixed = Conf(), Prefixed()
+        assert utils.filter_fields(os.environ, conf) == env.get_environment(conf) == env.get_environment(prefixed)
+
+        results = {
+            'filter the environment': measure(lambda: utils.filter_fields(os.environ, conf), rounds),
+            'look up the fields': measure(lambda: env.get_environment(conf), rounds),
+            'look up the fields (prefix)': measure(lambda: env.get_environment(prefixed), rounds),
+        }
+
+    print(f'{len(environ)} environment variables, {n_fields} fields, median of {rounds} rounds')
+    for name, elapsed in results.items():
+        print(f'  {name:<30} {elapsed * 1000:8.2f} ms')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,86 @@
+"""Help rendering latency: fast component info vs. IPython's oinspect
+
+Runs `tool.py x -h` in fresh processes for each variant and prints the
+median wall time. The help cache is disabled, so that the help is rendered
+every time.
+
+    python benchmarks/help_latency.py [rounds]
+
+Variants:
+    fast                    the default, IPython is not imported
+    ipython                 CLIMA_IPYTHON_INFO=1 with IPython installed
+    ipython (missing)       CLIMA_IPYTHON_INFO=1, IPython made unimportable
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from textwrap import dedent
+
+ROOT = Path(__file__).resolve().parent.parent
+
+TOOL = dedent('''
+    import sys
+    if sys.argv.pop(1) == 'block-ipython':
+        sys.modules['IPython'] = None
+
+    from clima import c, Schema
+
+
+    class C(Schema):
+        a: int = 1  # the a
+        b: str = 'b'  # the b
+
+
+    @c
+    class Cli:
+        def x(self):
+            """x docstring"""
+''')
+
+
+def measure(tool, env, block_ipython, rounds):
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, str(tool), 'block-ipython' if block_ipython else '-', 'x', '-h'],
+            env=env, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            check=True,
+        )
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main(rounds=10):
+    try:
+        import IPython  # noqa: F401
+        has_ipython = True
+    except ImportError:
+        has_ipython = False
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tool = Path(tmp) / 'tool.py'
+        tool.write_text(TOOL)
+        env = dict(os.environ, PYTHONPATH=str(ROOT), CLIMA_NO_CACHE='1')
+        env.pop('CLIMA_IPYTHON_INFO', None)
+        ipython_env = dict(env, CLIMA_IPYTHON_INFO='1')
+
+        variants = [('fast', env, False)]
+        if has_ipython:
+            variants.append(('ipython', ipython_env, False))
+        variants.append(('ipython (missing)', ipython_env, True))
+
+        for name, variant_env, block_ipython in variants:
+            median = measure(tool, variant_env, block_ipython, rounds)
+            print(f'{name:20s} {median * 1000:8.1f} ms')
+
+    if not has_ipython:
+        print('IPython is not installed, install it to compare against oinspect')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,73 @@
+"""Secret decryption: one gpg process per field vs. concurrent vs. a single batch
+
+Uses a fake gpg (a python script on PATH) with a fixed startup cost, so only
+the process handling is measured, not the cryptography.
+
+    python benchmarks/secrets_decryption.py [fields] [gpg startup ms]
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from textwrap import dedent
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+FAKE_GPG = dedent('''
+    #!{executable}
+    import sys, time
+    time.sleep({startup})
+    if '--decrypt-files' in sys.argv:
+        for path in sys.argv[sys.argv.index('--decrypt-files') + 1:]:
+            with open(path[:-len('.gpg')], 'w') as wf:
+                wf.write(open(path).read())
+    else:
+        print(open(sys.argv[-1]).read())
+''').lstrip()
+
+
+def measure(password_store, keynames, env):
+    with mock.patch.dict(os.environ, env):
+        start = time.perf_counter()
+        secrets = password_store.get_secrets_for(keynames)
+        elapsed = time.perf_counter() - start
+    assert all(secrets.values())
+    return elapsed
+
+
+def main(fields=6, startup_ms=30):
+    os.environ['CLIMA_NO_CACHE'] = '1'
+    from clima import password_store
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bin_dir = Path(tmp) / 'bin'
+        bin_dir.mkdir()
+        gpg = bin_dir / 'gpg'
+        gpg.write_text(FAKE_GPG.format(executable=sys.executable, startup=startup_ms / 1000))
+        gpg.chmod(0o755)
+
+        store = Path(tmp) / 'store'
+        store.mkdir()
+        (store / '.gpg-id').write_text('id')
+        keynames = [f'field_{i}' for i in range(fields)]
+        for keyname in keynames:
+            (store / f'{keyname}.gpg').write_text(f'{keyname} secret')
+
+        os.environ['PATH'] = f'{bin_dir}{os.pathsep}{os.environ["PATH"]}'
+        password_store.PW_STORE_PATH = str(store)
+
+        variants = [
+            ('per field', {'CLIMA_GPG_CONCURRENCY': '1', 'CLIMA_GPG_BATCH': ''}),
+            ('concurrent (4)', {'CLIMA_GPG_CONCURRENCY': '4', 'CLIMA_GPG_BATCH': ''}),
+            ('batch', {'CLIMA_GPG_CONCURRENCY': '1', 'CLIMA_GPG_BATCH': '1'}),
+        ]
+        print(f'{fields} secrets, gpg startup {startup_ms} ms')
+        for name, env in variants:
+            print(f'{name:16s} {measure(password_store, keynames, env) * 1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -1,8 +1,33 @@
 """Simple boilerplate for cli scripts"""
-import importlib.metadata
-__version__= importlib.metadata.version('clima')
+from clima.core import c, freeze, hand_off, Schema
 
-from clima import fire
-from clima.core import c, Schema
-from clima.helputils import print_help, HelpString
-from clima.utils import suppress_traceback
+# Attributes resolved on first access, so that `import clima` stays cheap
+# for short lived scripts: name -> (module, attribute or None for the module itself)
+_LAZY_ATTRIBUTES = {
+    'fire': ('clima.fire', None),
+    'print_help': ('clima.helputils', 'print_help'),
+    'HelpString': ('clima.helputils', 'HelpString'),
+    'suppress_traceback': ('clima.utils', 'suppress_traceback'),
+}
+
+
+def __getattr__(name):
+    if name == '__version__':
+        import importlib.metadata
+        version = importlib.metadata.version('clima')
+        globals()['__version__'] = version
+        return version
+
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+    import importlib
+    module_name, attr = _LAZY_ATTRIBUTES[name]
+    module = importlib.import_module(module_name)
+    value = module if attr is None else getattr(module, attr)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_ATTRIBUTES) + ['__version__'])
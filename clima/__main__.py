@@ -0,0 +1,53 @@
+"""Clima's own utilities
+
+    python -m clima help-cache path/to/my_tool.py    # build the help cache of a cli ahead of time
+    eval "$(python -m clima agent [--ttl SECONDS])"  # start the secret cache agent
+    python -m clima agent flush|stop                 # flush or stop the agent in $CLIMA_AGENT_SOCK
+"""
+import argparse
+import sys
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='python -m clima')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    help_cache = subparsers.add_parser('help-cache', help='build the help cache of a cli ahead of time')
+    help_cache.add_argument('script')
+
+    agent_parser = subparsers.add_parser('agent', help='start, flush or stop the secret cache agent')
+    agent_parser.add_argument('action', nargs='?', choices=['start', 'flush', 'stop'], default='start')
+    agent_parser.add_argument('--ttl', type=float, default=None, help='seconds to keep a secret')
+    agent_parser.add_argument('--foreground', action='store_true')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'help-cache':
+        from clima import helpcache
+        helpcache.main(args.script)
+        return 0
+
+    from clima import agent
+    if not agent.is_supported():
+        print('The agent needs unix sockets and fork, i.e. a POSIX system', file=sys.stderr)
+        return 1
+
+    if args.action == 'start':
+        agent.start(ttl=args.ttl if args.ttl is not None else agent.DEFAULT_TTL, foreground=args.foreground)
+        return 0
+
+    if not agent.is_enabled():
+        print(f'{agent.ENV_SOCK} is not defined', file=sys.stderr)
+        return 1
+
+    try:
+        getattr(agent, args.action)()
+    except OSError as ex:
+        print(f'Agent not reachable: {ex}', file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
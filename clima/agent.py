@@ -0,0 +1,216 @@
+"""Secret cache agent
+
+A small local daemon, similar to ssh-agent, keeping the decrypted secrets of
+the password store in memory, so that repeated runs of a cli (e.g. cron jobs
+or shell loops) don't decrypt the same secrets again and again:
+
+    eval "$(python -m clima agent --ttl 600)"
+    my_tool sub    # decrypts the secrets with gpg
+    my_tool sub    # gets the secrets from the agent
+    python -m clima agent flush
+    python -m clima agent stop
+
+The agent listens on a unix socket in a private directory (mode 0700). The
+clis find it with $CLIMA_AGENT_SOCK. The cached secrets expire after the ttl,
+and are evicted once the modification time of their .gpg file changes.
+
+Unix sockets and fork are needed, so the agent is available on POSIX systems
+only. Elsewhere (e.g. Windows) the secrets are always decrypted.
+
+The protocol is a json request per line, answered with a json line:
+
+    {"op": "get", "paths": [...]}                   -> {"values": [secret or null, ...]}
+    {"op": "put", "entries": [[path, secret, mtime_ns], ...]}   -> {"ok": true}
+    {"op": "flush"}                                 -> {"ok": true}
+    {"op": "stop"}                                  -> {"ok": true}
+"""
+import json
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+
+ENV_SOCK = 'CLIMA_AGENT_SOCK'
+
+DEFAULT_TTL = 300
+
+
+def socket_path():
+    """The agent's socket from $CLIMA_AGENT_SOCK, if any"""
+    return os.environ.get(ENV_SOCK) or None
+
+
+def is_supported() -> bool:
+    """Whether the platform has unix sockets and fork (POSIX)"""
+    return hasattr(socket, 'AF_UNIX') and hasattr(os, 'fork')
+
+
+def is_enabled() -> bool:
+    """Whether an agent caching the secrets is running (and $CLIMA_AGENT_SOCK is defined)"""
+    return is_supported() and socket_path() is not None
+
+
+def mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class SecretCache:
+    """Secrets by the path of their .gpg file, valid for ttl seconds and as long as the file is unchanged"""
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is None:
+                return None
+
+            secret, entry_mtime_ns, expires = entry
+            if time.monotonic() > expires or mtime_ns(path) != entry_mtime_ns:
+                del self.entries[path]
+                return None
+
+            return secret
+
+    def put(self, path, secret, entry_mtime_ns):
+        with self.lock:
+            self.entries[path] = (secret, entry_mtime_ns, time.monotonic() + self.ttl)
+
+    def flush(self):
+        with self.lock:
+            self.entries.clear()
+
+    def handle(self, request: dict) -> dict:
+        op = request.get('op')
+        if op == 'get':
+            return {'values': [self.get(path) for path in request['paths']]}
+        elif op == 'put':
+            for path, secret, entry_mtime_ns in request['entries']:
+                self.put(path, secret, entry_mtime_ns)
+        elif op == 'flush':
+            self.flush()
+        elif op != 'stop':
+            return {'error': f'unknown op {op!r}'}
+
+        return {'ok': True}
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                response = self.server.cache.handle(request)
+            except (ValueError, KeyError, TypeError) as ex:
+                request, response = {}, {'error': str(ex)}
+
+            self.wfile.write(json.dumps(response).encode('UTF-8') + b'\n')
+            if request.get('op') == 'stop':
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                break
+
+
+# Without unix sockets (e.g. Windows) the class is only defined, start() refuses to run
+class AgentServer(socketserver.ThreadingMixIn, getattr(socketserver, 'UnixStreamServer', socketserver.TCPServer)):
+    daemon_threads = True
+
+    def __init__(self, path, ttl=DEFAULT_TTL):
+        self.cache = SecretCache(ttl)
+        super().__init__(path, RequestHandler)
+        os.chmod(path, 0o600)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.server_address)
+            os.rmdir(os.path.dirname(self.server_address))
+        except OSError:
+            pass
+
+
+def new_socket_path():
+    """Socket in a new private directory, preferably in $XDG_RUNTIME_DIR"""
+    from clima.password_store import runtime_dir
+
+    return os.path.join(tempfile.mkdtemp(prefix='clima-agent-', dir=runtime_dir()), 'agent.sock')
+
+
+def start(ttl=DEFAULT_TTL, foreground=False):
+    """Starts the agent and prints the shell commands to use it (for eval). Raises OSError if the platform
+    isn't supported (see is_supported).
+    """
+    if not is_supported():
+        raise OSError('The agent needs unix sockets and fork, i.e. a POSIX system')
+
+    path = new_socket_path()
+    server = AgentServer(path, ttl)
+
+    if not foreground:
+        pid = os.fork()
+        if pid:
+            server.socket.close()
+            print(f'{ENV_SOCK}={path}; export {ENV_SOCK};')
+            print(f'echo Agent pid {pid};')
+            return
+
+        os.setsid()
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in range(3):
+            os.dup2(devnull, fd)
+    else:
+        print(f'{ENV_SOCK}={path}; export {ENV_SOCK};', flush=True)
+
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+    if not foreground:
+        os._exit(0)
+
+
+def request(message: dict, path=None, timeout=1.0) -> dict:
+    """Sends a request to the agent. Raises OSError if it's not reachable."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path or socket_path())
+        sock.sendall(json.dumps(message).encode('UTF-8') + b'\n')
+        with sock.makefile('rb') as rf:
+            line = rf.readline()
+
+    try:
+        return json.loads(line)
+    except ValueError:
+        raise OSError('Invalid response from the agent')
+
+
+def get(paths) -> list:
+    """Cached secrets for the .gpg paths (None for a miss), all misses if the agent isn't reachable"""
+    try:
+        return request({'op': 'get', 'paths': list(paths)})['values']
+    except (OSError, KeyError):
+        return [None] * len(paths)
+
+
+def put(entries):
+    """Caches the secrets given as [(path, secret, mtime_ns when decrypted), ...]"""
+    try:
+        request({'op': 'put', 'entries': [list(entry) for entry in entries]})
+    except OSError:
+        pass
+
+
+def flush():
+    request({'op': 'flush'})
+
+
+def stop():
+    request({'op': 'stop'})
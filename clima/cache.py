@@ -0,0 +1,117 @@
+"""Persistent cache for things derived from source files
+
+Entries are json files under the cache directory. Each entry records the
+source files it was derived from, and is valid as long as those files are
+unchanged: a matching (mtime, size) is trusted as is, otherwise the content
+hash decides (e.g. after a `touch` or a fresh checkout). A directory can be a
+source as well, it's unchanged as long as its mtime is i.e. no entries have
+been added, removed or renamed in it.
+
+The cache directory is $CLIMA_CACHE_DIR, or $XDG_CACHE_HOME/clima, or
+~/.cache/clima. Setting CLIMA_NO_CACHE disables reading and writing entries.
+"""
+import hashlib
+import json
+import os
+import stat
+import tempfile
+from pathlib import Path
+
+
+def cache_dir() -> Path:
+    if 'CLIMA_CACHE_DIR' in os.environ:
+        return Path(os.environ['CLIMA_CACHE_DIR'])
+
+    xdg_cache = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(xdg_cache) / 'clima'
+
+
+def is_enabled() -> bool:
+    return not os.environ.get('CLIMA_NO_CACHE')
+
+
+def file_hash(path) -> str:
+    with open(path, 'rb') as rf:
+        return hashlib.sha256(rf.read()).hexdigest()
+
+
+def file_stamp(path) -> dict:
+    """Identifies the state of a source file (or directory)"""
+    st = os.stat(path)
+    is_dir = stat.S_ISDIR(st.st_mode)
+    return {
+        'path': os.fspath(path),
+        'mtime_ns': st.st_mtime_ns,
+        'size': None if is_dir else st.st_size,
+        'sha256': None if is_dir else file_hash(path),
+    }
+
+
+def is_fresh(stamp: dict) -> bool:
+    """Whether the file recorded in stamp is still the same"""
+    try:
+        st = os.stat(stamp['path'])
+    except OSError:
+        return False
+
+    if stamp['sha256'] is None:
+        return st.st_mtime_ns == stamp['mtime_ns'] and stat.S_ISDIR(st.st_mode)
+
+    if st.st_mtime_ns == stamp['mtime_ns'] and st.st_size == stamp['size']:
+        return True
+
+    # Touched, but maybe not changed
+    if st.st_size == stamp['size'] and file_hash(stamp['path']) == stamp['sha256']:
+        stamp['mtime_ns'] = st.st_mtime_ns
+        return True
+
+    return False
+
+
+def entry_path(namespace: str, key: str) -> Path:
+    digest = hashlib.sha1(key.encode('UTF-8')).hexdigest()
+    return cache_dir() / namespace / f'{digest}.json'
+
+
+def load(namespace: str, key: str):
+    """Cached data for key, or None if missing or any of its sources have changed"""
+    if not is_enabled():
+        return None
+
+    try:
+        with open(entry_path(namespace, key), 'r', encoding='UTF-8') as rf:
+            entry = json.load(rf)
+    except (OSError, ValueError):
+        return None
+
+    if entry.get('key') != key or not all(is_fresh(stamp) for stamp in entry['sources']):
+        return None
+
+    return entry['data']
+
+
+def store(namespace: str, key: str, data, sources=()):
+    """Write data for key, valid as long as the files in sources are unchanged.
+
+    Failing to write (e.g. read-only home directory) is not an error, the cache
+    is merely an optimization.
+    """
+    if not is_enabled():
+        return
+
+    path = entry_path(namespace, key)
+    tmp_path = None
+    try:
+        entry = {
+            'key': key,
+            'sources': [file_stamp(source) for source in sources],
+            'data': data,
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='UTF-8') as wf:
+            json.dump(entry, wf)
+        os.replace(tmp_path, path)
+    except (OSError, TypeError, ValueError):
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
@@ -1,58 +1,170 @@
-"""Configuration file (sth.cfg) handling"""
-import configparser
+"""Configuration file (sth.cfg) handling
+
+Both finding the configuration file and parsing it are cached (see
+clima.cache): the discovery as long as the directories looked into are
+unchanged, and the parsed file as long as the file is. Defining
+$CLIMA_CONFIG pins the path of the configuration file and skips the
+discovery altogether.
+
+Besides the [Clima] section, the file may define profiles, e.g. [Clima:prod],
+which inherit the values of [Clima]. Every profile is merged once when the file
+is parsed and cached along with it, so switching between them doesn't parse
+the file again. The profile is selected with the Fire flag `-- --profile prod`
+or $CLIMA_PROFILE.
+"""
+import os
 import sys
 
 from pathlib import Path
 
+from clima import dirscan
+
+NAMESPACE = 'configfile'
+
+SECTION = 'Clima'
+# Sections of the profiles, e.g. [Clima:prod]
+PROFILE_PREFIX = f'{SECTION}:'
+
+# The profile selected with the Fire flag `--profile`
+SELECTED = {'profile': None}
+
 
 def is_in_module(f):
-    return len(list(Path(f).parent.glob('__init__.py')))
+    return dirscan.is_file(Path(f).parent / '__init__.py')
 
 
 def cfgs_gen(p):
-    yield from Path(p).glob('*.conf')
-    yield from Path(p).glob('*.cfg')
+    yield from dirscan.files_with_suffix(p, '.conf')
+    yield from dirscan.files_with_suffix(p, '.cfg')
 
 
-def find_cfg(p, level=2):
+def find_cfg(p, level=2, probed=None):
+    """First config file in p, or in its parent package directories up to level.
+    The directories looked into are appended to probed, if given.
+    """
     p = Path(p)
+    if probed is not None:
+        probed += [p, p.parent]
+
     cfgs = list(cfgs_gen(p))
     if len(cfgs) == 0:
         if is_in_module(p) and level > 0:
-            return find_cfg(p.parent, level - 1)
+            return find_cfg(p.parent, level - 1, probed)
         else:
             return None
     else:
         return cfgs[0]
 
 
-def read_config(_filepath='test.cfg') -> dict:
-    filepath = Path(_filepath)
-    parsed_conf = {}
-    if not filepath.exists():
-        return parsed_conf
+def discover_cfg(p, level=2, probed=None):
+    """find_cfg, cached as long as none of the directories it looked into have changed.
+    The paths of those directories are appended to probed, if given.
+    """
+    from clima import cache
+
+    key = f'{Path(p).absolute()}:{level}'
+    cached = cache.load(NAMESPACE, key)
+    if cached is not None and 'probed' in cached:
+        if probed is not None:
+            probed += cached['probed']
+        return Path(cached['path']) if cached['path'] is not None else None
+
+    looked_into = []
+    cfg = find_cfg(p, level, looked_into)
+    cfg = cfg.absolute() if cfg is not None else None
+    sources = sorted({os.fspath(directory.absolute()) for directory in looked_into if dirscan.is_dir(directory)})
+    data = {'path': os.fspath(cfg) if cfg is not None else None, 'probed': sources}
+    cache.store(NAMESPACE, key, data, sources=sources)
+    if probed is not None:
+        probed += sources
+
+    return cfg
+
+
+def own_options(text) -> dict:
+    """The options each section of the config file defines itself (i.e. not inherited from [DEFAULT])
+    as {section: {option, ...}}
+    """
+    import configparser
+    # No section is the default one, so that [DEFAULT] is a section like the others
+    raw = configparser.RawConfigParser(default_section='\0', strict=False)
+    raw.read_string(text)
+    return {section: set(raw[section]) for section in raw.sections()}
+
 
+def compile_profiles(file_config, own) -> dict:
+    """The values of [Clima] and of each profile [Clima:<name>] merged over them as {name or '': values}.
+    As usual, the values of [DEFAULT] apply to every section.
+    """
+    base_section = SECTION if file_config.has_section(SECTION) else file_config.default_section
+    base = dict(file_config[base_section])
+    profiles = {'': base}
+    for section in file_config.sections():
+        if section.startswith(PROFILE_PREFIX):
+            profile = file_config[section]
+            profiles[section[len(PROFILE_PREFIX):].strip()] = {
+                **base, **{option: profile[option] for option in own.get(section, ())}}
+
+    return profiles
+
+
+def parse_profiles(filepath) -> dict:
+    """compile_profiles of the config file, cached as long as the file is unchanged"""
+    from clima import cache
+    key = os.fspath(filepath.absolute())
+    cached = cache.load(NAMESPACE, f'{key}:profiles')
+    if cached is not None:
+        return cached
+
+    import configparser
     try:
+        with open(filepath) as rf:
+            text = rf.read()
         file_config = configparser.ConfigParser()
-        file_config.read(filepath)
+        file_config.read_string(text, source=os.fspath(filepath))
         # TODO: When fixing version printing with reflection, use this to alternatively use
         # package name for the config section
-        if 'Clima' in file_config:
-            parsed_conf = dict(file_config['Clima'])
+        if file_config.has_section(SECTION) or any(s.startswith(PROFILE_PREFIX) for s in file_config.sections()):
+            profiles = compile_profiles(file_config, own_options(text))
+            cache.store(NAMESPACE, f'{key}:profiles', profiles, sources=[key])
+            return profiles
         else:
             print('warning: config file found at {}, but it was missing section named [Clima]'.format(str(filepath)))
     except:
-        print(f'warning: clima deducted {_filepath} to be a valid config file, but could not read it.', file=sys.stderr)
+        print(f'warning: clima deducted {filepath} to be a valid config file, but could not read it.', file=sys.stderr)
+
+    return {'': {}}
+
+
+def select_profile(name):
+    """Select the profile, e.g. with the Fire flag `-- --profile prod`"""
+    SELECTED['profile'] = name or None
+
+
+def get_profile():
+    """The profile selected with the Fire flag `--profile` or $CLIMA_PROFILE, or None"""
+    return SELECTED['profile'] or os.environ.get('CLIMA_PROFILE') or None
+
+
+def read_config(_filepath='test.cfg', profile=None) -> dict:
+    """The values of the [Clima] section, or of the [Clima:<profile>] section merged over them"""
+    filepath = Path(_filepath)
+    if not dirscan.exists(filepath):
+        return {}
 
-    return parsed_conf
+    profiles = parse_profiles(filepath)
+    if profile and profile not in profiles:
+        print(f'warning: config file {_filepath} has no profile named [{PROFILE_PREFIX}{profile}]', file=sys.stderr)
+    return dict(profiles.get(profile or '', profiles['']))
 
 
-def get_config_path(_schema):
+def get_config_path(_schema, probed=None):
     """
     Resolve filepath for a config file, if one can be found.
 
     Args:
         _schema:
+        probed: list to append the directories looked into by the discovery to, if given
 
     Returns:
         Path of config file or None
@@ -66,13 +178,15 @@ def get_config_path(_schema):
         {CFG: 'my.cfg'}                     -> select my.cfg at pwd
         {CFG: '/root/foo/my.cfg'}           -> select cfg using absolute path
 
+    Without an existing CFG, $CLIMA_CONFIG is used if defined, instead of globbing.
     """
     # if hasattr cfg and absolute, use cfg
     cfg_filepath = Path(getattr(_schema, 'CFG', ''))
     if not cfg_filepath.is_absolute():
         # concate getattr cwd/'' getattr cfg/''
         cfg_filepath = Path(getattr(_schema, 'cwd', '')) / cfg_filepath
-        if not cfg_filepath.is_file():
-            cfg_filepath = find_cfg(cfg_filepath)
+        if not dirscan.is_file(cfg_filepath):
+            pinned = os.environ.get('CLIMA_CONFIG')
+            cfg_filepath = Path(pinned) if pinned else discover_cfg(cfg_filepath, probed=probed)
 
     return cfg_filepath
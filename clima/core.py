@@ -1,15 +1,14 @@
 import fileinput
 import inspect
-import os
 import sys
 from collections import ChainMap
+from collections.abc import Mapping
 from functools import partial
 from pathlib import Path
 from typing import Dict
 
-from clima import docstring, configfile
-from clima import schema, utils, password_store, env
-from clima.fire import Fire
+from clima import docstring, configfile, helpcache, manifest
+from clima import dirscan, handoff, layers, schema, timings, utils
 
 
 class RequiredParameterException(Exception):
@@ -28,26 +27,73 @@ class Configurable:
     """Configuration management"""
     # TODO: idiomatic handling for use cases that apply to NamedTuple
     __configured = None
+    __fallback = None
 
     def _get_configured(self):
         return self.__configured
 
-    def _set_configured(self, dct: dict):
+    def _set_configured(self, dct: dict, fallback=None):
+        """Values missing from dct are looked up from fallback (i.e. the schema), for example
+        the lazily resolved version
+        """
         self.__configured = dct
+        self.__fallback = fallback
 
     def _chain_configurations(self, params: dict, _schema):
-        """Chains all configuration options together"""
-        cm = ChainMap(
-            params,
-            utils.filter_fields(os.environ, _schema),
-            env.get_env(_schema),
-            _schema._get_configfile_asdict(),
-            password_store.get_secrets(_schema),
-            _schema._asdict()
+        """Chains all configuration options together. The layers are loaded
+        lazily, i.e. only when a field is not found in the layers above them,
+        or concurrently up front with $CLIMA_CONCURRENT_LAYERS (see clima.layers)
+        """
+        # Imported here, so that `import clima` doesn't pay for dotenv and the password store
+        from clima import env, lockfile, password_store
+
+        # Each value is cast once, when its layer is loaded (params, config file and defaults are cast already)
+        registry = schema.fields(_schema)
+        fields = _schema._asdict()
+        lockfile_path = lockfile.lockfile_path()
+        handed = handoff.received(registry)
+        handed_secrets = {}
+        if handed is not None:
+            # Resolved by the parent process (see clima.handoff)
+            handed_values, handed_secrets = handed
+            higher = ChainMap(params, handed_values)
+        elif lockfile_path is not None:
+            # The environment, .env and config file resolved once (see clima.lockfile), except for the secrets
+            higher = ChainMap(
+                params,
+                layers.LazyLayer('lockfile', lambda: lockfile.get_locked(lockfile_path, _schema, registry)),
+                layers.LazyLayer('unlocked', lambda: lockfile.get_unlocked(_schema, registry)),
+            )
+        else:
+            higher = ChainMap(
+                params,
+                layers.LazyLayer('environment', lambda: schema.cast_fields(registry, env.get_environment(_schema))),
+                layers.LazyLayer('.env', lambda: schema.cast_fields(registry, env.get_env(_schema))),
+                layers.LazyLayer('config file', _schema._get_configfile_asdict),
+            )
+
+        def get_secret(field):
+            return schema.cast_field(registry, field, password_store.get_secret(field))
+
+        def needed_secrets():
+            # By the time a field is looked up from the password store, the layers above are loaded
+            needed = [field for field in fields if field not in higher and field not in handed_secrets]
+            secrets = password_store.get_secrets_for(needed)
+            return schema.cast_fields(registry, secrets)
+
+        # With concurrent or batch decryption, all the secrets not defined above are decrypted at once, even the ones
+        # the subcommand never reads (see password_store.prefetch_enabled)
+        secrets = layers.KeyedLayer(
+            'password store', fields, get_secret,
+            prefetch=needed_secrets if password_store.prefetch_enabled() else None,
+            known=handed_secrets,
         )
 
-        # self.__configured = dict(cm)
-        return dict(cm)
+        if layers.is_concurrent():
+            # The secrets needed depend on the layers above, so only the password store's index is built up front
+            layers.load_concurrently(higher.maps, password_store.index)
+
+        return ChainMap(*higher.maps, secrets, layers.LazyLayer('defaults', _schema._asdict))
 
     def _init(self, _schema: schema.MetaSchema):
         is_schema = isinstance(_schema, schema.MetaSchema)
@@ -56,6 +102,7 @@ class Configurable:
 
         # Allows using Schema as a subclass only
         c.__configured = _schema
+        c.__fallback = None
 
         # Allows deoorator usage with @c.init
         return schema_decorator(_schema)
@@ -76,11 +123,11 @@ class Configurable:
 
     def __getattr__(self, item):
         res = None
-        if self.__configured is not None:
-            try:
-                res = self.__configured[item]
-            except Exception:
-                res = getattr(self.__configured, item)
+        configured = self.__configured
+        if isinstance(configured, Mapping) and item in configured:
+            res = configured[item]
+        elif configured is not None:
+            res = getattr(configured if self.__fallback is None else self.__fallback, item)
 
         if res is None:
             raise RequiredParameterException(f'Missing argument for "{item}"')
@@ -96,6 +143,9 @@ class Configurable:
         """Testing requires clearing global state"""
 
         c.__configured = None
+        dirscan.clear()
+        configfile.select_profile(None)
+        handoff.clear()
 
         global DECORATORS_STATE
         DECORATORS_STATE = {
@@ -107,6 +157,29 @@ class Configurable:
 c = Configurable()
 
 
+def freeze():
+    """Immutable snapshot of the resolved configuration with plain attribute access, e.g.
+    for reading the fields in hot loops (see clima.snapshot)
+    """
+    from clima import snapshot
+
+    configured = c._get_configured()
+    if DECORATORS_STATE['schema'] is None or not isinstance(configured, layers.Resolved):
+        raise RuntimeError('The configuration is not resolved yet, freeze it in a subcommand')
+    return snapshot.freeze(configured, DECORATORS_STATE['schema'])
+
+
+def hand_off(secrets=False):
+    """Context manager giving the keyword arguments for subprocess.run or Popen, which hand the resolved
+    configuration off to a child clima process (see clima.handoff). The secrets are handed off only if
+    secrets is true, through an inherited pipe.
+    """
+    configured = c._get_configured()
+    if not isinstance(configured, layers.Resolved):
+        raise RuntimeError('The configuration is not resolved yet, hand it off in a subcommand')
+    return handoff.hand_off(configured, DECORATORS_STATE['schema'], secrets=secrets)
+
+
 def add_to_decorators(key, value):
     DECORATORS_STATE[key] = value
 
@@ -121,19 +194,9 @@ def cast_as_annotated(_schema, attr, container=None, value=None):
 
     if value is None:
         value = getattr(container, attr)
-    result = value
-
-    if hasattr(type(_schema), '__annotations__'):
-        annotated_type = type(_schema).__annotations__.get(attr)
-        if annotated_type is not None:
 
-            # TODO: Nested types. Here we'll wrap a string or uniterable into an iterable
-            # To prevent surprises such as 'VST' -> ('V', 'S', 'T') when expecting ('VST')
-            if schema.should_wrap_as_list(value, annotated_type):
-                result = annotated_type([value])
-            else:
-                result = annotated_type(value)
-    return result
+    field = schema.fields(_schema).get(attr)
+    return field.caster(value) if field is not None else value
 
 
 def cli(cls):
@@ -144,12 +207,17 @@ def cli(cls):
 
     def init(self, **cli_args):
         """Generated init"""
+        if state.get('skip_configuration'):
+            return
+
         s = state['schema']
+        registry = schema.fields(s)
 
         # Cast everything according to schema before Cli.post_init
+        cli_args = schema.cast_fields(registry, cli_args)
         for attr, cli_arg_value in cli_args.items():
             if hasattr(s, attr):
-                setattr(s, attr, cast_as_annotated(s, attr, value=cli_arg_value))
+                setattr(s, attr, cli_arg_value)
             s: type(s) = s
 
         if hasattr(s, 'cwd'):
@@ -166,32 +234,31 @@ def cli(cls):
         #         cli_args[attr] = cast_as_annotated(s, attr)
 
         global c
-        cm = c._chain_configurations(cli_args, s)
-        # initialize_cli(cli_args, s)
+        chained = c._chain_configurations(cli_args, s)
 
+        # The values are resolved, when they are read
+        resolved = layers.Resolved(chained)
         tmp_c = Configurable()
-        tmp_c._set_configured(cm)
-        # TODO: consider if really necessary
-        for attr in s._asdict():
-            if attr in cm:
-                setattr(tmp_c, attr, cast_as_annotated(s, attr, container=tmp_c))
+        tmp_c._set_configured(resolved, fallback=s)
 
         if hasattr(CliClass, 'post_init'):
             CliClass.post_init(tmp_c)
 
-            # TODO: consider if really necessary
-            for attr in s._asdict():
-                if hasattr(tmp_c, attr):
-                    setattr(tmp_c, attr, cast_as_annotated(s, attr, container=tmp_c))
+        # Values set in post_init take precedence (e.g. overriding the lazy version)
+        for attr, value in list(vars(tmp_c).items()):
+            if not attr.startswith('_'):
+                resolved.override(attr, schema.cast_field(registry, attr, value))
 
-        for attr in tmp_c._get_configured():
-            setattr(c, attr, getattr(tmp_c, attr))
-            # setattr(c, attr, cast_as_annotated(s, attr, container=tmp_c))
-            # c._set_configured(tmp_c._get_configured())
+        # Values published by a previous run (e.g. in tests) would shadow the new ones
+        for attr in [attr for attr in vars(c) if not attr.startswith('_')]:
+            delattr(c, attr)
+        c._set_configured(resolved, fallback=s)
 
     cls_attrs = dict(
         __init__=init,
         __repr__=cls.__repr__,
+        __module__=cls.__module__,
+        __qualname__=cls.__qualname__,
         **{m_name: m for m_name, m in cls.__dict__.items() if not m_name.startswith('_')}
     )
 
@@ -204,12 +271,15 @@ def cli(cls):
 class Schema(object, metaclass=schema.MetaSchema):
     """Base class for the user's configuration class"""
 
+    # Prefix of the fields' environment variables, set with `class Conf(Schema, env_prefix='MYTOOL_')`
+    _env_prefix = ''
+
     def _get_configfile_asdict(self):
         result: Dict = {}
 
         configfile_path = configfile.get_config_path(self)
         if configfile_path is not None:
-            result = utils.filter_fields(configfile.read_config(configfile_path), self)
+            result = utils.filter_fields(configfile.read_config(configfile_path, configfile.get_profile()), self)
             result = utils.type_correct_with(result, self)
 
         return result
@@ -227,36 +297,26 @@ class Schema(object, metaclass=schema.MetaSchema):
 
     @property
     def _fields(self):
-        fields = [
-            k for k in self.__dir__()
-            if not k.startswith('_') and not inspect.ismethod(getattr(self, k))
-        ]
-        return fields
+        # version is resolved lazily, so it's not a field of the registry
+        return [*schema.fields(self), 'version']
 
     def __call__(self, *args, **kwargs):
         pass
 
 
-def prepare_signatures(cls, schema):
-    """Adds possible parameters gathered from Schema to all methods
-    defined in the 'Cli' class (decorated with @c). This way the parameters
-    are the same for all methods, but at the same time they don't need to
-    be duplicated in every method signature.
-    """
-
-    methods = {
-        k: v for k, v in cls.__dict__.items()
-        if not k.startswith('_') and inspect.isfunction(v)
-    }
-
-    params_with_post_init = [
-        inspect.Parameter(name=field, kind=inspect._VAR_KEYWORD)
-        for field in schema._fields
+def schema_parameters(fields, kind=inspect._VAR_KEYWORD):
+    """The Schema's fields as keyword parameters for the subcommands' signatures"""
+    # post_init is not a field
+    return [
+        inspect.Parameter(name=field, kind=kind)
+        for field in fields if field != 'post_init'
     ]
 
-    # pop the post_init from the end of parameters
-    params = [prm for prm in params_with_post_init if prm.name != 'post_init']
-    print(params)
+
+def prepare_argv(params):
+    """Maps piped input and positional arguments into sys.argv as keyword arguments
+    in the order of the Schema's fields (params)
+    """
 
     # Check for piped input (stdin)
     if len(sys.argv) >= 2 and not sys.stdin.isatty():
@@ -270,7 +330,7 @@ def prepare_signatures(cls, schema):
     # Hacking sys.argv to include positional keywords with assumed keyword names
     # as I couldn't find another workaround to tell python-fire how to parse these
     # The alternative had been to integrate python-fire with tighter coupling into this
-    if len(sys.argv) > 2 and not any(['-h' in sys.argv, '--help' in sys.argv]):
+    if len(sys.argv) > 2 and not is_help(sys.argv):
         new_args = sys.argv[0:2]
         i = 2
         while i < len(sys.argv):
@@ -282,37 +342,162 @@ def prepare_signatures(cls, schema):
                 # no need to parse for positional arguments after this point
                 new_args += sys.argv[i:]
                 break
+            elif arg == '--':
+                # Separator for Fire's own flags (e.g. -- --trace)
+                new_args += sys.argv[i:]
+                break
             else:
                 new_args.append(f'--{prm.name}')
                 new_args.append(f'{arg}')
                 i += 1
         sys.argv = new_args
 
+
+def prepare_signature(method, params):
+    # The original is kept, so that preparing again won't add the parameters twice
+    sig = getattr(method, '_clima_signature', None) or inspect.signature(method)
+    method._clima_signature = sig
+    new_parameters = [v for v in sig.parameters.values()]
+    new_parameters += params
+
+    method.__signature__ = sig.replace(parameters=new_parameters)
+
+
+def prepare_signatures(cls, schema, fields=None, kind=inspect._VAR_KEYWORD):
+    """Adds possible parameters gathered from Schema to all methods
+    defined in the 'Cli' class (decorated with @c). This way the parameters
+    are the same for all methods, but at the same time they don't need to
+    be duplicated in every method signature.
+    """
+
+    methods = {
+        k: v for k, v in cls.__dict__.items()
+        if not k.startswith('_') and inspect.isfunction(v)
+    }
+
+    if fields is None:
+        fields = schema._fields
+
+    params = schema_parameters(fields, kind)
     for m_name, method in methods.items():
-        sig = inspect.signature(method)
-        new_parameters = [v for v in sig.parameters.values()]
-        new_parameters += params
+        prepare_signature(method, params)
+
+
+def help_preparer(cls, cli_manifest):
+    """The signatures and docstrings only matter for the help and usage, so they are
+    prepared when fire is about to render those and only for the subcommand shown.
+    """
+    commands = cli_manifest['commands']
+
+    def prepare_component(component):
+        method = getattr(component, '__func__', component)
+        name = getattr(method, '__name__', None)
+        if name in commands and getattr(cls, name, None) is method:
+            prepare_signature(method, schema_parameters(cli_manifest['fields']))
+            docstring.replace_docstring(method, docstring.format_help(cli_manifest['help']))
+
+    return prepare_component
+
+
+def split_flag_args(argv):
+    """argv's arguments and fire's own flags, which follow the last '--' separator
+    (see clima.fire.parser.SeparateFlagArgs)
+    """
+    args = argv[1:]
+    if '--' not in args:
+        return args, []
+
+    separator_index = len(args) - 1 - args[::-1].index('--')
+    return args[:separator_index], args[separator_index + 1:]
+
+
+def is_help(argv):
+    """Whether fire shows the help for argv: -h/--help among fire's own flags or, without a '--' separator,
+    as the last argument. Elsewhere -h is e.g. the value of an option `my_tool sub --pattern -h --all`
+    """
+    args, flag_args = split_flag_args(argv)
+    if flag_args:
+        return any(arg in helpcache.HELP_FLAGS for arg in flag_args)
+
+    return bool(args) and args[-1] in helpcache.HELP_FLAGS
+
+
+def pop_profile(argv) -> tuple:
+    """argv without clima's --profile flag among fire's flags (e.g. `my_tool sub -- --profile prod`), which fire
+    doesn't know, and the profile or None
+    """
+    args, flag_args = split_flag_args(argv)
+    profile = None
+    rest = []
+    i = 0
+    while i < len(flag_args):
+        arg = flag_args[i]
+        if arg == '--profile' and i + 1 < len(flag_args):
+            profile = flag_args[i + 1]
+            i += 2
+            continue
+        if arg.startswith('--profile='):
+            profile = arg.split('=', 1)[1]
+        else:
+            rest.append(arg)
+        i += 1
+
+    if rest == flag_args:
+        return argv, None
+    return [argv[0], *args, *(['--', *rest] if rest else [])], profile
+
+
+def is_completion(argv):
+    return '--completion' in split_flag_args(argv)[1]
+
 
-        method.__signature__ = sig.replace(parameters=new_parameters)
+def is_help_or_completion(argv):
+    """Fast path check: neither help nor the completion script need the configuration"""
+    return is_help(argv) or is_completion(argv)
 
 
 def prepare(cls, schema: Schema):
     """Beef: prepares signatures, docstrings and initiates fire for the cli-magic
     Also: error handling printout customisation
     """
-    prepare_signatures(cls, schema)
-    docstring.wrap_method_docstring(cls, schema)
-
     with utils.suppress_traceback():
+        # The directories are listed (once) afresh for each invocation
+        dirscan.clear()
 
         if len(sys.argv) > 1 and sys.argv[-1] == 'version':
             # Version printing part 2
+            # Fast path: nothing else is needed
             print(schema.version)
+            return
 
-            # TODO: fix version printing maybe with the latest:
-            # import importlib.metadata
-            # package = ... # reflection
-            # print(importlib.metadata.version(package))
+        if is_help(sys.argv):
+            # Fast path: the prebuilt help (see clima.helpcache) exits here
+            helpcache.serve()
 
-        else:
-            Fire(cls)
+        with timings.phase('manifest'):
+            cli_manifest = manifest.get(cls, schema)
+
+        # Before the configuration is chained
+        sys.argv, profile = pop_profile(sys.argv)
+        configfile.select_profile(profile)
+
+        with timings.phase('prepare_argv'):
+            prepare_argv(schema_parameters(cli_manifest['fields']))
+
+        # Fast path: the help and completion don't need the configuration chain
+        DECORATORS_STATE['skip_configuration'] = is_help_or_completion(sys.argv)
+
+        with timings.phase('import clima.fire'):
+            from clima.fire import Fire
+            from clima.fire import helputils
+
+        helputils.SetComponentPreparer(help_preparer(cls, cli_manifest))
+        if is_completion(sys.argv):
+            # The completion script lists the named (not variadic) parameters of the signatures
+            prepare_signatures(cls, schema, cli_manifest['fields'], inspect._KEYWORD_ONLY)
+
+        if DECORATORS_STATE['skip_configuration'] and helpcache.requested_command(sys.argv) is not None:
+            with timings.phase('helpcache'):
+                helpcache.build(cls, schema, cli_manifest['commands'])
+
+        Fire(cls)
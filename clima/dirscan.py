@@ -0,0 +1,81 @@
+"""Shared directory listings
+
+The file based configuration sources look for their files in the same few
+directories: the config file (*.conf/*.cfg and the __init__.py of the package
+directories), .env and pyproject.toml. Instead of each of them globbing and
+stat'ing, every directory is listed once with os.scandir and the listing is
+shared, which matters on e.g. network filesystems where each call is a round
+trip. The listings are kept for the invocation (see clear()).
+
+The layers may be loaded concurrently (see clima.layers), so the scanning is
+serialized to list each directory once all the same.
+"""
+import os
+import threading
+from pathlib import Path
+
+# absolute directory path -> {name: is a file}, or None if it couldn't be listed
+LISTINGS = {}
+
+SCANNING = threading.Lock()
+
+
+def clear():
+    """Forget the listings, e.g. when starting a new invocation"""
+    LISTINGS.clear()
+
+
+def scan(directory):
+    key = os.path.abspath(directory)
+    if key in LISTINGS:
+        return LISTINGS[key]
+
+    with SCANNING:
+        if key in LISTINGS:
+            return LISTINGS[key]
+
+        try:
+            entries = {}
+            with os.scandir(key) as it:
+                for entry in it:
+                    try:
+                        # The file type comes with the listing on most filesystems, i.e. no stat needed
+                        entries[entry.name] = entry.is_file()
+                    except OSError:
+                        entries[entry.name] = False
+        except OSError:
+            entries = None
+        LISTINGS[key] = entries
+
+    return entries
+
+
+def listing(directory) -> dict:
+    """The entries of directory as {name: is a file}, in the order of os.scandir.
+    A missing (or unreadable) directory has no entries.
+    """
+    return scan(directory) or {}
+
+
+def is_dir(directory) -> bool:
+    """Whether directory could be listed"""
+    return scan(directory) is not None
+
+
+def is_file(path) -> bool:
+    path = Path(path)
+    return listing(path.parent).get(path.name, False)
+
+
+def exists(path) -> bool:
+    path = Path(path)
+    return path.name in listing(path.parent)
+
+
+def files_with_suffix(directory, suffix):
+    """Paths of the files in directory named *suffix, like Path(directory).glob('*' + suffix)"""
+    return [
+        Path(directory) / name
+        for name, file in listing(directory).items()
+        if file and name.endswith(suffix)
+    ]
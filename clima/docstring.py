@@ -1,9 +1,22 @@
 """Doc string handling"""
+import ast
 import inspect
-from collections import OrderedDict
+import io
+import textwrap
+import tokenize
+from weakref import WeakKeyDictionary
 
+# Parsed help tables per Schema class, see help_table()
+HELP_TABLES = WeakKeyDictionary()
 
-def wrap_method_docstring(cls: object, nt):
+
+def list_commands(cls):
+    """Names of the subcommands i.e. public methods of the Cli class"""
+    return [m.name for m in inspect.classify_class_attrs(cls)
+            if m.kind == 'method' and not m.name.startswith('_')]
+
+
+def wrap_method_docstring(cls: object, nt, commands=None, args=None):
     """
     In place mutation of 'nt' (NamedTuple)
 
@@ -12,76 +25,69 @@ def wrap_method_docstring(cls: object, nt):
     defined arguments in Schema instead of a generic "**params" for the
     subcommands on command line.
 
+    Args:
+        commands: names of the subcommands, listed from cls if not given
+        args: prepared help for the arguments, parsed from nt if not given
+
     Returns:
         None
     """
-    methods = [m.object for m in inspect.classify_class_attrs(cls)
-               if m.kind == 'method' and not m.name.startswith('_')]
-    for m in methods:
+    if commands is None:
+        commands = list_commands(cls)
+    if args is None:
         args = prepare_docstring_help(nt)
-        replace_docstring(m, args)
+
+    for name in commands:
+        replace_docstring(getattr(cls, name), args)
+
+
+def original_docstring(func):
+    """Docstring of func before the args were appended"""
+    return getattr(func, '_clima_docstring', func.__doc__)
 
 
 # TODO: rename - append args to docstring
 def replace_docstring(func, args):
     # TODO: subcommand level args replacement with something (see TODO)
-    docstring = func.__doc__
-    docstring = (docstring if docstring is not None else '') + '\nArgs:\n' + args
-    func.__doc__ = docstring
+    # The original is kept, so that preparing again won't append the args twice
+    docstring = original_docstring(func)
+    func._clima_docstring = docstring
+    func.__doc__ = (docstring if docstring is not None else '') + '\nArgs:\n' + args
 
 
-def attr_map(parsed_params):
-    """Mapping for the schema's fields (parameters)"""
-    mapped_attrs = {}
-    for param_type, def_desc in parsed_params.items():
-        if ':' in param_type:
-            param, _type = param_type.split(':', 1)
-            _type = _type.strip()
-        else:
-            param = param_type
-            _type = None
-
-        # TODO: this won't handle # in strings ...
-        if '#' in def_desc:
-            default, description = def_desc.split('#', 1)
-            default = default.strip()
-            description = description.strip()
-        else:
-            default = def_desc.strip()
-            description = ''
-
-        mapped_attrs.update(
-            {
-                param: {
-                    'type': _type,
-                    'default': default,
-                    'description': description,
-                }
-            }
-        )
-    return mapped_attrs
+def parse_schema_source(cls):
+    """
+    Parse the source of the schema class in a single pass for its annotated
+    fields. The comment following a field is its description:
 
+        # attribute: type = default value  # Description for the --help
 
-def parse_source_for_params(params):
-    """
-    parse the source of the schema and split its
-    fields
+    Returns:
+        {field: {'type': ..., 'default': ..., 'description': ...}}
     """
-    split_parameters = {
-        tuple(
-            str(argtype_and_defdesc).strip()
-            for argtype_and_defdesc in src_line.split('=', 1)
-        )
-        for src_line in params
-        if src_line.startswith(' ')
+    source = textwrap.dedent(inspect.getsource(cls))
+
+    # Tokenizing finds the comments, while leaving '#' inside strings alone
+    comments = {
+        token.start[0]: token.string[1:].strip()
+        for token in tokenize.generate_tokens(io.StringIO(source).readline)
+        if token.type == tokenize.COMMENT
     }
-    try:
-        params_dict = OrderedDict(split_parameters)
-    except ValueError as ex:
-        params_dict = {}
 
-    return params_dict
+    class_def = ast.parse(source).body[0]
+    mapped_attrs = {}
+    for node in class_def.body:
+        if not (isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name)):
+            continue
+
+        default = ast.get_source_segment(source, node.value) if node.value is not None else ''
+        mapped_attrs[node.target.id] = {
+            'type': ast.get_source_segment(source, node.annotation),
+            'default': default,
+            'description': comments.get(node.end_lineno, ''),
+        }
 
+    return mapped_attrs
 
 
 def argument_help(attr_name, attr):
@@ -90,36 +96,26 @@ def argument_help(attr_name, attr):
     return fmt.format(attr_name, _type, attr['description'], attr['default'])
 
 
-# TODO: rename - list_of_source_lines
-def filter_params(N):
-    """Filter source lines of the class
-    Returns:
-        fields as source lines
+def help_table(N):
+    """Help details of the schema's annotated fields as
+    {field: {'type': ..., 'default': ..., 'description': ...}}
+
+    The source is parsed once per Schema class, the result is shared by
+    all the subcommands (and should not be mutated).
     """
-    filtered_source = []
-    for line in inspect.getsourcelines(N.__class__)[0][1:]:
-        # When parsing, post_init would bleed into the attributes without this hack
-        if line.strip().startswith('def '):
-            break
-        filtered_source.append(line)
-    return filtered_source
+    cls = N if isinstance(N, type) else type(N)
+    if cls not in HELP_TABLES:
+        HELP_TABLES[cls] = parse_schema_source(cls) if getattr(cls, '__annotations__', None) else {}
+
+    return HELP_TABLES[cls]
+
+
+def format_help(table):
+    return '\n'.join(argument_help(attr_name, attr) for attr_name, attr in table.items())
 
 
 # TODO: rename - parse_args_for_help
 def prepare_docstring_help(N):
     """Replace docstrings to include the parameters (schema)"""
     # at this point, the params have not yet been populated
-
-    args = []
-    if hasattr(N, '__annotations__'):
-        for attr_name, cls in N.__annotations__.items():
-
-            filtered = filter_params(N)
-            parsed = parse_source_for_params(filtered)
-            attr = attr_map(parsed).get(attr_name)
-            if attr is None:
-                continue
-
-            args.append(argument_help(attr_name, attr))
-
-    return '\n'.join(args)
+    return format_help(help_table(N))
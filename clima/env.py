@@ -1,24 +1,208 @@
+"""Environment variables and .env file handling
+
+Each field is looked up from the environment by its name, or with the schema's
+prefix (`class Conf(Schema, env_prefix='MYTOOL_')`) as e.g. MYTOOL_field or
+MYTOOL_FIELD, instead of going through the whole environment. The names are
+computed once per schema class (see ENVIRONMENT_NAMES).
+
+The .env file is scanned binding by binding for the keys only, delimiting the
+bindings as python-dotenv's parser does but without decoding their values.
+Only the bindings of the schema's fields, and of the keys their ${VAR}
+references use, are decoded with python-dotenv (the clima[dotenv] extra), so
+the syntax and semantics are dotenv's, e.g. the last definition of a key wins.
+As a later definition may follow anywhere, the whole file is scanned.
+
+The positions of the kept bindings (never their values, .env files often hold
+credentials) are persisted in the cache (see clima.cache) as long as the file
+is unchanged, so that repeated runs don't scan the file again.
+"""
+import io
+import os
+import re
 from pathlib import Path
 from typing import Dict
 
-from dotenv import dotenv_values
+from clima import dirscan, utils
 
-from clima import utils
+NAMESPACE = 'env'
 
+# schema class -> {field: environment variable names, in the order of precedence}
+ENVIRONMENT_NAMES = {}
+
+# The grammar of python-dotenv's parser, without capturing the values
+_multiline_whitespace = re.compile(r'\s*', re.MULTILINE)
+_whitespace = re.compile(r'[^\S\r\n]*')
+_export = re.compile(r'(?:export[^\S\r\n]+)?')
+_single_quoted_key = re.compile(r"'([^']+)'")
+_unquoted_key = re.compile(r'([^=#\s]+)')
+_equal_sign = re.compile(r'=[^\S\r\n]*')
+_single_quoted_value = re.compile(r"'(?:\\'|[^'])*'")
+_double_quoted_value = re.compile(r'"(?:\\"|[^"])*"')
+_unquoted_value = re.compile(r'[^\r\n]*')
+_comment = re.compile(r'(?:[^\S\r\n]*#[^\r\n]*)?')
+_end_of_line = re.compile(r'[^\S\r\n]*(?:\r\n|\n|\r|$)')
+_rest_of_line = re.compile(r'[^\r\n]*(?:\r|\n|\r\n)?')
+
+# ${VAR} or ${VAR:-default} as expanded by dotenv
+_variable = re.compile(r'\$\{(?P<name>[^}:]*)(?::-(?P<default>[^}]*))?\}')
+
+# Fields that never come from the .env file
+NOT_IN_ENV_FILE = ('version',)
+
+
+class ScanError(Exception):
+    pass
+
+
+def skip(regex, text, pos) -> int:
+    match = regex.match(text, pos)
+    if match is None:
+        raise ScanError(pos)
+    return match.end()
+
+
+def scan(text):
+    """The bindings in the text of a .env file as (key, start, end), delimited as dotenv's parser does
+    without decoding the values. Comments and invalid lines are skipped.
+    """
+    pos = 0
+    while pos < len(text):
+        start = pos
+        key = None
+        try:
+            pos = skip(_multiline_whitespace, text, pos)
+            if pos == len(text):
+                return
+            pos = skip(_export, text, pos)
+            if not text.startswith('#', pos):
+                match = (_single_quoted_key if text.startswith("'", pos) else _unquoted_key).match(text, pos)
+                if match is None:
+                    raise ScanError(pos)
+                key, pos = match.group(1), match.end()
+            pos = skip(_whitespace, text, pos)
+            if text.startswith('=', pos):
+                pos = skip(_equal_sign, text, pos)
+                quote = text[pos:pos + 1]
+                if quote in ("'", '"'):
+                    pos = skip(_single_quoted_value if quote == "'" else _double_quoted_value, text, pos)
+                elif quote not in ('', '\n', '\r'):
+                    pos = skip(_unquoted_value, text, pos)
+            pos = skip(_comment, text, pos)
+            pos = skip(_end_of_line, text, pos)
+        except ScanError:
+            # As dotenv, the rest of the line is skipped
+            pos = skip(_rest_of_line, text, pos)
+            continue
+
+        if key is not None:
+            yield key, start, pos
+
+
+def kept_spans(text, fields) -> list:
+    """(start, end) of every definition of the fields, and of the keys their ${VAR} references use, in text"""
+    definitions = {}
+    for key, start, end in scan(text):
+        definitions.setdefault(key, []).append((start, end))
+
+    kept = set()
+    pending = [field for field in fields if field in definitions]
+    while pending:
+        key = pending.pop()
+        if key in kept:
+            continue
+        kept.add(key)
+        for start, end in definitions[key]:
+            pending += [m.group('name') for m in _variable.finditer(text, start, end) if m.group('name') in definitions]
+
+    return sorted(span for key in kept for span in definitions[key])
 
-def get_env(_schema) -> Dict:
-    """Load values found in _schema from .env file"""
-    verbose: bool = utils.chain_get(
-        (getattr, _schema, 'debug', None),
-        (getattr, _schema, 'verbose', None),
-    ) is not None
 
+def read_env(text, fields, spans=None) -> tuple:
+    """Values of fields in the text of a .env file (as dotenv_values reads them) and the environment variables
+    the expansion may have used. Only the bindings at spans (see kept_spans) are decoded.
+
+    Returns:
+        ({field: value (None without a value)}, {variable: value in os.environ or None})
+    """
+    from dotenv import dotenv_values
+
+    if spans is None:
+        spans = kept_spans(text, fields)
+
+    # Each binding parses the same on its own, and the expansion only refers to the kept keys
+    kept = ''.join(text[start:end] for start, end in spans)
+    values = dotenv_values(stream=io.StringIO(kept))
+    environ = {name: os.environ.get(name) for name in sorted({m.group('name') for m in _variable.finditer(kept)})}
+    return {field: values[field] for field in fields if field in values}, environ
+
+
+def environment_names(_schema) -> dict:
+    """The environment variable names of the schema's fields as {field: (name, ...)}"""
+    cls = type(_schema)
+    if cls not in ENVIRONMENT_NAMES:
+        prefix = getattr(_schema, '_env_prefix', '')
+        if prefix:
+            ENVIRONMENT_NAMES[cls] = {
+                field: tuple(dict.fromkeys([f'{prefix}{field}', f'{prefix}{field}'.upper()]))
+                for field in _schema._fields
+            }
+        else:
+            ENVIRONMENT_NAMES[cls] = {field: (field,) for field in _schema._fields}
+
+    return ENVIRONMENT_NAMES[cls]
+
+
+def get_environment(_schema) -> Dict:
+    """Values of _schema's fields defined in the environment"""
+    result = {}
+    for field, names in environment_names(_schema).items():
+        for name in names:
+            if name in os.environ:
+                result[field] = os.environ[name]
+                break
+
+    return result
+
+
+def env_file_fields(_schema) -> tuple:
+    return tuple(field for field in _schema._fields if field not in NOT_IN_ENV_FILE)
+
+
+def load_env(_schema) -> tuple:
+    """Values of _schema's fields in the .env file, with the file's path and the environment variables the
+    expansion may have used as (path, {field: value}, {variable: value in os.environ or None})
+    """
     cwd = utils.chain_get(
         (getattr, _schema, 'cwd', None),
         tuple([Path.cwd]),
     )
 
     env_file = Path(cwd) / '.env'
-    env_dict = dotenv_values(stream=env_file)
+    if not dirscan.is_file(env_file):
+        return env_file, {}, {}
+
+    from clima import cache
+    fields = env_file_fields(_schema)
+    path = os.path.abspath(env_file)
+    key = f'{path}:{",".join(fields)}'
+    cached = cache.load(NAMESPACE, key)
+
+    try:
+        with open(env_file, 'r', encoding='UTF-8') as rf:
+            text = rf.read()
+        spans = [tuple(span) for span in cached['spans']] if cached is not None else kept_spans(text, fields)
+        values, environ = read_env(text, fields, spans)
+    except OSError:
+        return env_file, {}, {}
+    except ImportError:
+        # Without clima[dotenv], the .env file is skipped
+        return env_file, {}, {}
 
-    return utils.filter_fields(env_dict, _schema)
+    if cached is None:
+        cache.store(NAMESPACE, key, {'spans': spans}, sources=[path])
+    return env_file, values, environ
+
+
+def get_env(_schema) -> Dict:
+    """Load values found in _schema from .env file"""
+    return load_env(_schema)[1]
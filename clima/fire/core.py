@@ -46,6 +46,7 @@ The available flags for all Fire CLIs are:
   --completion: Write the Bash completion script for the tool to stdout.
   --separator SEPARATOR: Use SEPARATOR in place of the default separator, '-'.
   --trace: Get the Fire Trace for the command.
+  --timings [table|json|FILE]: Report the time spent in clima's startup phases.
 """
 
 from __future__ import absolute_import
@@ -67,6 +68,7 @@ from clima.fire import inspectutils
 from clima.fire import interact
 from clima.fire import parser
 from clima.fire import trace
+from clima import timings
 import six
 
 
@@ -116,15 +118,19 @@ def Fire(component=None, command=None, name=None):
                      'arguments.')
 
   # Determine the calling context.
-  caller = inspect.stack()[1]
-  caller_frame = caller[0]
+  # The frame is enough, inspect.stack() would also read the source of every frame
+  caller_frame = inspect.currentframe().f_back
   caller_globals = caller_frame.f_globals
   caller_locals = caller_frame.f_locals
   context = {}
   context.update(caller_globals)
   context.update(caller_locals)
 
-  component_trace = _Fire(component, args, context, name)
+  with timings.phase('Fire'):
+    component_trace = _Fire(component, args, context, name)
+
+  if component_trace.show_timings:
+    timings.report(component_trace.show_timings)
 
   if component_trace.HasError():
     for help_flag in ['-h', '--help']:
@@ -321,6 +327,7 @@ def _Fire(component, args, context, name=None):
   show_completion = parsed_flag_args.completion
   show_help = parsed_flag_args.help
   show_trace = parsed_flag_args.trace
+  show_timings = parsed_flag_args.timings
 
   # component can be a module, class, routine, object, etc.
   if component is None:
@@ -329,7 +336,8 @@ def _Fire(component, args, context, name=None):
   initial_component = component
   component_trace = trace.FireTrace(
       initial_component=initial_component, name=name, separator=separator,
-      verbose=verbose, show_help=show_help, show_trace=show_trace)
+      verbose=verbose, show_help=show_help, show_trace=show_trace,
+      show_timings=show_timings)
 
   instance = None
   remaining_args = args
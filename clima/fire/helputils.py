@@ -28,6 +28,27 @@ from clima.fire import completion
 from clima.fire import inspectutils
 
 
+_component_preparer = None
+
+
+def SetComponentPreparer(preparer):
+  """Sets a callable to prepare a component right before its help or usage is rendered.
+
+  This allows deferring work that only the help needs (e.g. generated docstrings)
+  until the help is actually shown, and only for the component shown.
+
+  Args:
+    preparer: Callable taking the component, or None.
+  """
+  global _component_preparer
+  _component_preparer = preparer
+
+
+def _PrepareComponent(component):
+  if _component_preparer is not None:
+    _component_preparer(component)
+
+
 def _NormalizeField(field):
   """Takes a field name and turns it into a human readable name for display.
 
@@ -88,6 +109,7 @@ def HelpString(component, trace=None, verbose=False):
   Returns:
     String suitable for display giving information about the component.
   """
+  _PrepareComponent(component)
   info = inspectutils.Info(component)
   info['usage'] = UsageString(component, trace, verbose)
 
@@ -183,6 +205,7 @@ def _UsageStringFromFullArgSpec(command, spec):
 
 def UsageString(component, trace=None, verbose=False):
   """Returns a string showing how to use the component as a Fire command."""
+  _PrepareComponent(component)
   command = trace.GetCommand() + ' ' if trace else ''
 
   if inspect.isroutine(component) or inspect.isclass(component):
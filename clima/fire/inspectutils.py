@@ -19,9 +19,19 @@ from __future__ import division
 from __future__ import print_function
 
 import inspect
+import os
+import types
 
 import six
 
+# Python's auto-generated docstrings, which are not worth showing
+_FUNC_CALL_DOCSTRING = types.FunctionType.__call__.__doc__
+_OBJECT_INIT_DOCSTRING = object.__init__.__doc__
+_BUILTIN_TYPE_DOCSTRINGS = {
+    inspect.getdoc(t) for t in (types.ModuleType, types.MethodType,
+                                types.FunctionType, property)
+}
+
 
 class FullArgSpec(object):
   """The arguments of a function, as in Python 3's inspect.FullArgSpec."""
@@ -152,11 +162,18 @@ def Info(component):
     call_docstring: The call docstring of `component`.
     length: The length of `component`.
 
+  By default only the fields shown by the help are gathered, see _InfoFast.
+  Set the environment variable CLIMA_IPYTHON_INFO to use IPython's oinspect
+  (if installed) for all of the fields.
+
   Args:
     component: The component to analyze.
   Returns:
     A dict with information about the component.
   """
+  if not os.environ.get('CLIMA_IPYTHON_INFO'):
+    return _InfoFast(component)
+
   try:
     from IPython.core import oinspect  # pylint: disable=g-import-not-at-top
     inspector = oinspect.Inspector()
@@ -173,6 +190,66 @@ def Info(component):
   return info
 
 
+def _GetDoc(obj):
+  """inspect.getdoc, which can't crash because of attribute problems."""
+  try:
+    return inspect.getdoc(obj)
+  except Exception:  # pylint: disable=broad-except
+    return None
+
+
+def _IsSimpleCallable(obj):
+  return (inspect.isfunction(obj) or inspect.ismethod(obj) or isinstance(
+      obj, (types.BuiltinFunctionType, types.MethodDescriptorType)))
+
+
+def _InfoFast(component):
+  """Returns a dict with the information about the component shown in the help.
+
+  The fields (type_name, docstring, init_docstring, class_docstring,
+  call_docstring and length) match those of IPython's oinspect, but are
+  gathered with attribute lookups only i.e. without importing IPython or
+  reading the source file.
+
+  Args:
+    component: The component to analyze.
+  Returns:
+    A dict with information about the component.
+  """
+  info = {}
+  info['type_name'] = type(component).__name__
+
+  docstring = _GetDoc(component)
+  info['docstring'] = docstring if docstring is not None else '<no docstring>'
+
+  try:
+    info['length'] = str(len(component))
+  except Exception:  # pylint: disable=broad-except
+    pass
+
+  try:
+    init_docstring = _GetDoc(component.__init__)
+  except AttributeError:
+    init_docstring = None
+  if init_docstring and init_docstring != _OBJECT_INIT_DOCSTRING:
+    info['init_docstring'] = init_docstring
+
+  if inspect.isclass(component):
+    return info
+
+  class_docstring = _GetDoc(type(component))
+  if (class_docstring and class_docstring not in _BUILTIN_TYPE_DOCSTRINGS
+      and class_docstring != info['docstring']):
+    info['class_docstring'] = class_docstring
+
+  if hasattr(component, '__call__') and not _IsSimpleCallable(component):
+    call_docstring = _GetDoc(component.__call__)
+    if call_docstring and call_docstring != _FUNC_CALL_DOCSTRING:
+      info['call_docstring'] = call_docstring
+
+  return info
+
+
 def _InfoBackup(component):
   """Returns a dict with information about the given component.
 
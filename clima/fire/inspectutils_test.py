@@ -0,0 +1,98 @@
+# Copyright (C) 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the inspectutils module."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import unittest
+
+from clima.fire import inspectutils
+from clima.fire import testutils
+
+import mock
+
+# The fields shown by helputils.HelpString
+HELP_FIELDS = ('type_name', 'docstring', 'init_docstring', 'class_docstring',
+               'call_docstring', 'length')
+
+
+class Documented(object):
+  """Class docstring."""
+
+  def __init__(self, value=1):
+    """Init docstring."""
+    self.value = value
+
+  def Method(self):
+    """Method docstring."""
+
+  def __call__(self):
+    """Call docstring."""
+
+
+class Undocumented(object):
+  pass
+
+
+def Function():
+  pass
+
+
+COMPONENTS = [
+    Documented, Documented(), Documented().Method, Undocumented,
+    Undocumented(), Function, [1, 2], {'a': 1}, 'string', 3, os, len, None,
+]
+
+
+class InfoTest(testutils.BaseTestCase):
+
+  def testInfoFastByDefault(self):
+    with mock.patch.dict(os.environ, {'CLIMA_IPYTHON_INFO': ''}):
+      with mock.patch.dict(sys.modules, {'IPython': None}):
+        info = inspectutils.Info(Documented)
+    self.assertEqual(info['docstring'], 'Class docstring.')
+    self.assertEqual(info['init_docstring'], 'Init docstring.')
+    self.assertNotIn('line', info)
+
+  def testInfoFastDocstrings(self):
+    info = inspectutils._InfoFast(Documented())  # pylint: disable=protected-access
+    self.assertEqual(info['type_name'], 'Documented')
+    self.assertEqual(info['call_docstring'], 'Call docstring.')
+    self.assertNotIn('class_docstring', info)
+    self.assertEqual(
+        inspectutils._InfoFast(Function)['docstring'], '<no docstring>')  # pylint: disable=protected-access
+    self.assertEqual(inspectutils._InfoFast([1, 2])['length'], '2')  # pylint: disable=protected-access
+
+  def testInfoFastMatchesIPython(self):
+    try:
+      import IPython  # pylint: disable=g-import-not-at-top,unused-import
+    except ImportError:
+      raise unittest.SkipTest('IPython is not installed')
+
+    with mock.patch.dict(os.environ, {'CLIMA_IPYTHON_INFO': '1'}):
+      for component in COMPONENTS:
+        fast = inspectutils._InfoFast(component)  # pylint: disable=protected-access
+        full = inspectutils.Info(component)
+        for field in HELP_FIELDS:
+          self.assertEqual(fast.get(field), full.get(field),
+                           msg='{} of {!r}'.format(field, component))
+
+
+if __name__ == '__main__':
+  testutils.main()
@@ -27,6 +27,12 @@ class ParserTest(testutils.BaseTestCase):
   def testCreateParser(self):
     self.assertIsNotNone(parser.CreateParser())
 
+  def testCreateParserTimings(self):
+    argparser = parser.CreateParser()
+    self.assertIsNone(argparser.parse_args([]).timings)
+    self.assertEqual(argparser.parse_args(['--timings']).timings, 'table')
+    self.assertEqual(argparser.parse_args(['--timings', 'json']).timings, 'json')
+
   def testSeparateFlagArgs(self):
     self.assertEqual(parser.SeparateFlagArgs([]), ([], []))
     self.assertEqual(parser.SeparateFlagArgs(['a', 'b']), (['a', 'b'], []))
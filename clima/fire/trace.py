@@ -48,7 +48,7 @@ class FireTrace(object):
   """
 
   def __init__(self, initial_component, name=None, separator='-', verbose=False,
-               show_help=False, show_trace=False):
+               show_help=False, show_trace=False, show_timings=None):
     initial_trace_element = FireTraceElement(
         component=initial_component,
         action=INITIAL_COMPONENT,
@@ -60,6 +60,7 @@ class FireTrace(object):
     self.verbose = verbose
     self.show_help = show_help
     self.show_trace = show_trace
+    self.show_timings = show_timings
 
   def GetResult(self):
     """Returns the component from the last element of the trace."""
@@ -0,0 +1,179 @@
+"""Handing the resolved configuration off to child processes
+
+A clima cli spawning other clima clis can pass its resolved configuration to
+them, so that the children don't look up the environment, parse .env, discover
+the configuration file or decrypt the secrets again:
+
+    from clima import c, hand_off
+
+    with hand_off() as kwargs:
+        subprocess.run(['other_tool', 'sub'], **kwargs)
+
+The values of the command line arguments, environment, .env and configuration
+file, and those set in Cli.post_init, are serialized as json in $CLIMA_HANDOFF
+of the child's environment. The secrets of the password store (and values set
+in post_init in place of them) are handed off only with hand_off(secrets=True),
+and only through a pipe inherited by the child ($CLIMA_HANDOFF_FD tells which),
+never in the environment.
+
+A child whose Schema has the same fields, annotated the same, uses the handed
+values in place of the environment, .env and configuration file, and the
+handed secrets in place of decrypting them. Its own command line arguments
+still take precedence. Otherwise the handoff is rejected with a warning and the
+child resolves its configuration itself. The variables are removed from the
+child's environment when read, so they aren't inherited further by accident.
+"""
+import os
+import sys
+from collections import ChainMap
+from contextlib import contextmanager
+
+from clima import layers, schema, validation
+
+ENV_BLOB = 'CLIMA_HANDOFF'
+ENV_FD = 'CLIMA_HANDOFF_FD'
+
+FORMAT = 2
+
+# 'handoff' -> what the parent handed off, read once per process
+RECEIVED = {}
+
+
+def clear():
+    RECEIVED.clear()
+
+
+def reject(reason):
+    print(f'warning: ignoring the configuration handed off by the parent process, {reason}', file=sys.stderr)
+
+
+def field_types(registry) -> dict:
+    """The fields and their annotations, which the parent's and the child's schemas must agree on"""
+    return {name: repr(field.annotation) for name, field in registry.items()}
+
+
+def split_layers(chained: ChainMap) -> tuple:
+    """The layers above the password store and the password store layer (or None)"""
+    for i, layer in enumerate(chained.maps):
+        if isinstance(layer, layers.KeyedLayer):
+            return chained.maps[:i], layer
+    return chained.maps, None
+
+
+def as_json(values: dict) -> dict:
+    """The values that can be serialized as json, encoded"""
+    import json
+    from clima.lockfile import encode
+
+    result = {}
+    for name, value in values.items():
+        try:
+            json.dumps(encode(value))
+        except (TypeError, ValueError):
+            continue
+        result[name] = encode(value)
+    return result
+
+
+def write_pipe(fd, data: bytes):
+    try:
+        with os.fdopen(fd, 'wb') as wf:
+            wf.write(data)
+    except OSError:
+        # The child didn't read it
+        pass
+
+
+@contextmanager
+def hand_off(resolved: layers.Resolved, _schema, secrets=False):
+    """Keyword arguments (env and pass_fds) for subprocess.run or Popen to hand off the configuration"""
+    import json
+    import threading
+
+    registry = schema.fields(_schema)
+    higher, secrets_layer = split_layers(resolved.layers)
+    above = ChainMap(*higher)
+    values = {field: above[field] for field in registry if field in above}
+
+    # The values set in post_init take the place of the layers' values. One replacing a secret
+    # (e.g. the secret stripped) is handed off as a secret.
+    secret_overrides = {}
+    for field in dict.fromkeys(resolved.overridden):
+        if field not in registry:
+            continue
+        if field not in values and secrets_layer is not None and secrets_layer.is_found(field):
+            secret_overrides[field] = resolved[field]
+        else:
+            values[field] = resolved[field]
+
+    environ = dict(os.environ)
+    environ.pop(ENV_FD, None)
+    environ[ENV_BLOB] = json.dumps({'format': FORMAT, 'fields': field_types(registry), 'values': as_json(values)})
+
+    read_fd = None
+    if secrets and secrets_layer is not None:
+        handed_secrets = {field: secrets_layer[field] for field in registry if field not in values
+                          and field not in secret_overrides and field in secrets_layer}
+        handed_secrets.update(secret_overrides)
+        read_fd, write_fd = os.pipe()
+        data = json.dumps(as_json(handed_secrets)).encode('UTF-8')
+        # Written in the background, as the pipe's buffer may not hold it all before the child reads
+        threading.Thread(target=write_pipe, args=(write_fd, data), daemon=True).start()
+        environ[ENV_FD] = str(read_fd)
+
+    try:
+        yield {'env': environ, 'pass_fds': (read_fd,) if read_fd is not None else ()}
+    finally:
+        if read_fd is not None:
+            os.close(read_fd)
+
+
+def receive():
+    """What the parent handed off as {'fields': [...], 'values': {...}, 'secrets': {...}}, or None"""
+    blob = os.environ.pop(ENV_BLOB, None)
+    fd = os.environ.pop(ENV_FD, None)
+    if blob is None and fd is None:
+        return None
+
+    import json
+    handed = None
+    try:
+        if blob is not None:
+            handed = json.loads(blob)
+            if not isinstance(handed, dict) or handed.get('format') != FORMAT:
+                reject(f'${ENV_BLOB} is not in the format {FORMAT}')
+                handed = None
+        if fd is not None:
+            with os.fdopen(int(fd), 'rb') as rf:
+                handed_secrets = json.loads(rf.read().decode('UTF-8'))
+            if handed is not None:
+                handed['secrets'] = handed_secrets
+    except (OSError, ValueError) as ex:
+        reject(f'it could not be read ({ex})')
+        return None
+
+    return handed
+
+
+def received(registry):
+    """The handed off values and secrets cast as (values, secrets), or None if nothing was handed off or
+    the fields (or their annotations) don't match
+    """
+    if 'handoff' not in RECEIVED:
+        RECEIVED['handoff'] = receive()
+
+    handed = RECEIVED['handoff']
+    if handed is None:
+        return None
+    # Warned about once
+    if handed.get('fields') != field_types(registry):
+        reject('the fields or their annotations differ from the Schema\'s')
+        RECEIVED['handoff'] = None
+        return None
+
+    try:
+        return schema.cast_fields(registry, handed['values']), schema.cast_fields(registry, handed.get('secrets', {}))
+    except validation.ValidationError as ex:
+        reject(f'a value is invalid ({ex})')
+        RECEIVED['handoff'] = None
+        return None
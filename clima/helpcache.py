@@ -0,0 +1,134 @@
+"""Prebuilt help texts
+
+Answering `my_tool sub -h` normally means importing the cli (and whatever it
+imports), creating the schema and rendering the help with fire. Instead, the
+rendered help of every subcommand is stored in the cache (see clima.cache)
+when the help is first shown, and the following help requests are answered
+straight from it when the cli is defined (@c), before the manifest or fire are
+loaded. The entry is valid as long as the source files of the cli are
+unchanged, otherwise the help is rendered live (and stored again).
+
+To answer before the script's own (heavy) imports as well, opt in by serving
+at the top of the script:
+
+    from clima import helpcache
+    helpcache.serve()
+
+The entries can also be built ahead of time, e.g. when installing the cli:
+
+    python -m clima help-cache path/to/my_tool.py
+"""
+import os
+import sys
+
+NAMESPACE = 'help'
+
+HELP_FLAGS = ('-h', '--help')
+
+
+def main_file():
+    """Absolute path of the script being run, if any"""
+    path = getattr(sys.modules.get('__main__'), '__file__', None)
+    return os.path.abspath(path) if path else None
+
+
+def entry_key(path, prog):
+    return f'{path}:{prog}'
+
+
+def requested_command(argv):
+    """The subcommand whose help argv asks for ('' for the cli itself) or None,
+    if argv is not a plain help request e.g.
+
+        my_tool -h
+        my_tool sub --help
+        my_tool sub -- --help
+    """
+    args = argv[1:]
+    if not args or args[-1] not in HELP_FLAGS:
+        return None
+
+    rest = args[:-1]
+    if rest and rest[-1] == '--':
+        rest = rest[:-1]
+
+    if not rest:
+        return ''
+    if len(rest) == 1 and not rest[0].startswith('-'):
+        return rest[0]
+
+    return None
+
+
+def serve(argv=None):
+    """Print the prebuilt help and exit, if argv is a help request and the help cache is fresh"""
+    argv = sys.argv if argv is None else argv
+    command = requested_command(argv)
+    path = main_file()
+    if command is None or path is None:
+        return
+
+    from clima import cache
+
+    texts = cache.load(NAMESPACE, entry_key(path, os.path.basename(argv[0])))
+    if texts is None or command not in texts:
+        return
+
+    sys.stderr.write(texts[command])
+    sys.exit(0)
+
+
+def render(cli, commands) -> dict:
+    """Help texts of the cli and its subcommands as printed by fire: {subcommand: text}"""
+    import io
+    from contextlib import redirect_stderr
+    from clima.fire import Fire
+
+    texts = {}
+    for command in ['', *commands]:
+        stderr = io.StringIO()
+        with redirect_stderr(stderr):
+            try:
+                Fire(cli, command=[command, '--', '--help'] if command else ['--', '--help'])
+            except SystemExit:
+                pass
+        texts[command] = stderr.getvalue()
+
+    return texts
+
+
+def build(cli, schema, commands, argv=None):
+    """Render and store the help texts, unless they are already in the cache"""
+    from clima import cache, manifest
+    from clima.fire import helputils
+
+    argv = sys.argv if argv is None else argv
+    path = main_file()
+    if path is None or not cache.is_enabled():
+        return
+
+    key = entry_key(path, os.path.basename(argv[0]))
+    if cache.load(NAMESPACE, key) is not None:
+        return
+
+    sources = {path, manifest.source_file(cli), manifest.source_file(type(schema)), helputils.__file__}
+    if None in sources:
+        return
+
+    cache.store(NAMESPACE, key, render(cli, commands), sources=sources)
+
+
+def main(script):
+    """Builds the help cache of the script by running it with --help"""
+    import io
+    import runpy
+    from contextlib import redirect_stderr
+
+    sys.argv = [script, '--help']
+    # Nothing is piped to the cli while building
+    sys.stdin = io.StringIO()
+    with redirect_stderr(io.StringIO()):
+        try:
+            runpy.run_path(script, run_name='__main__')
+        except SystemExit:
+            pass
@@ -0,0 +1,165 @@
+"""Lazily loaded configuration layers
+
+The configuration is a stack of layers, highest precedence first (see
+Configurable._chain_configurations). Instead of loading every layer up front,
+a layer is loaded the first time a field is looked up from it. A field given
+on the command line never touches the lower layers, and a secret is decrypted
+only for a field that is read and not found higher up in the stack.
+
+With $CLIMA_CONCURRENT_LAYERS set, the independent layers are instead loaded up
+front in a small thread pool (see load_concurrently), which helps when reading
+them waits on I/O, e.g. on network filesystems. Each layer still answers the
+lookups in the same order of precedence, so the result is the same as with the
+sequential loading. A layer failing to load in the pool is loaded again on its
+first lookup, which raises the error where the sequential loading would.
+"""
+import os
+from collections.abc import Mapping
+
+from clima import timings
+
+
+def is_concurrent() -> bool:
+    """Load the layers concurrently, enabled with $CLIMA_CONCURRENT_LAYERS"""
+    return bool(os.environ.get('CLIMA_CONCURRENT_LAYERS'))
+
+
+def load_concurrently(lazy_layers, *tasks):
+    """Start loading lazy_layers and running tasks (e.g. building an index the lower layers need) in a thread
+    pool. Doesn't wait for them, the layers wait for their data on the first lookup. The failures of the tasks
+    are ignored.
+    """
+    # Imported here, as it's needed only in the concurrent mode
+    from concurrent.futures import ThreadPoolExecutor
+
+    lazy_layers = [layer for layer in lazy_layers if isinstance(layer, LazyLayer)]
+    executor = ThreadPoolExecutor(max_workers=max(1, len(lazy_layers) + len(tasks)),
+                                  thread_name_prefix='clima-layer')
+    for layer in lazy_layers:
+        layer.start(executor)
+    for task in tasks:
+        executor.submit(task)
+    executor.shutdown(wait=False)
+
+
+class LazyLayer(Mapping):
+    """Layer loaded by calling loader() on the first lookup"""
+
+    def __init__(self, name, loader):
+        self.name = name
+        self._loader = loader
+        self._data = None
+        self._future = None
+
+    def _load(self) -> dict:
+        with timings.phase(f'config: {self.name}'):
+            return self._loader()
+
+    def start(self, executor):
+        """Start loading the layer in executor"""
+        if self._data is None and self._future is None:
+            self._future = executor.submit(self._load)
+
+    @property
+    def data(self) -> dict:
+        if self._data is None:
+            future, self._future = self._future, None
+            if future is not None and future.exception() is None:
+                self._data = future.result()
+            else:
+                self._data = self._load()
+        return self._data
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.name!r}, loaded={self._data is not None})'
+
+
+class KeyedLayer(Mapping):
+    """Layer loading each key separately by calling lookup(key) on its first lookup,
+    e.g. decrypting the secret of a single field. The lookup returns None for a missing key.
+
+    Optionally, prefetch() is called once on the first lookup to load several keys
+    at once (e.g. concurrently) as {key: value or None}. The values of known are
+    never looked up.
+    """
+
+    def __init__(self, name, keys, lookup, prefetch=None, known=None):
+        self.name = name
+        self._keys = dict.fromkeys(keys)
+        self._lookup = lookup
+        self._prefetch = prefetch
+        self._values = dict(known or {})
+
+    def __getitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+
+        if self._prefetch is not None:
+            prefetch, self._prefetch = self._prefetch, None
+            with timings.phase(f'config: {self.name} (prefetch)'):
+                self._values.update(prefetch())
+
+        if key not in self._values:
+            with timings.phase(f'config: {self.name} ({key})'):
+                self._values[key] = self._lookup(key)
+
+        value = self._values[key]
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def is_found(self, key):
+        """Whether the value of key has been looked up and found, without looking it up"""
+        return self._values.get(key) is not None
+
+    def __iter__(self):
+        # Looks up every key
+        return (key for key in self._keys if key in self)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.name!r}, looked_up={list(self._values)})'
+
+
+class Resolved(Mapping):
+    """The chained layers with each value looked up once, on first access"""
+
+    def __init__(self, layers: Mapping):
+        self.layers = layers
+        self._values = {}
+        self.overridden = []
+
+    def override(self, key, value):
+        """Set the final value of key, e.g. assigned in Cli.post_init"""
+        self._values[key] = value
+        self.overridden.append(key)
+
+    def __getitem__(self, key):
+        if key not in self._values:
+            self._values[key] = self.layers[key]
+        return self._values[key]
+
+    def loaded(self) -> dict:
+        """The values looked up (or overridden) so far, without looking up the rest"""
+        return dict(self._values)
+
+    def __iter__(self):
+        return iter(dict.fromkeys([*self._values, *self.layers]))
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        # Not listing the values, as they may include secrets
+        return f'{type(self).__name__}(resolved={list(self._values)})'
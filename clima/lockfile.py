@@ -0,0 +1,215 @@
+"""Resolved configuration lockfile
+
+Defining $CLIMA_LOCKFILE (a path) resolves the environment, .env and
+configuration file once and writes the values, as cast by the schema, to that
+file. The following runs read the values from the lockfile instead of looking
+up the environment variables, parsing .env and discovering and reading the
+configuration file:
+
+    export CLIMA_LOCKFILE=.clima.lock
+    my_tool sub    # resolves the configuration and writes .clima.lock
+    my_tool sub    # reads .clima.lock
+
+The lockfile records what the values were resolved from: the source files
+(see clima.cache for how they're compared), the names in the directories the
+config file was looked for in, the environment variables and the working
+directory. It's rejected and written again when any of them changes,
+or the schema's fields do. The command line arguments and the defaults aren't
+locked, and neither are the secrets of the password store.
+
+The values are written in plaintext, so the values of the fields with an entry
+in the password store aren't written at all, even if they're resolved from the
+environment, .env or configuration file: those are resolved on each run (see
+get_unlocked). Still, keep the lockfile out of version control, e.g. in
+.gitignore.
+"""
+import enum
+import json
+import os
+import tempfile
+from pathlib import PurePath
+
+from clima import cache, dirscan, schema, validation
+
+FORMAT = 1
+
+
+def lockfile_path():
+    return os.environ.get('CLIMA_LOCKFILE') or None
+
+
+def schema_id(_schema) -> str:
+    cls = type(_schema)
+    return f'{cls.__module__}.{cls.__qualname__}'
+
+
+def inputs(_schema) -> dict:
+    """What the resolution depends on besides the source files and the environment"""
+    from clima import configfile
+
+    return {
+        'cwd': os.getcwd(),
+        'schema_cwd': str(getattr(_schema, 'cwd', '')),
+        'CFG': str(getattr(_schema, 'CFG', '')),
+        'profile': configfile.get_profile(),
+    }
+
+
+def source_stamp(path) -> dict:
+    """cache.file_stamp, or a stamp recording that path is missing"""
+    try:
+        return cache.file_stamp(path)
+    except OSError:
+        return {'path': os.fspath(path), 'missing': True}
+
+
+def discovered_names(directory) -> list:
+    """The names in directory that the discovery of the config file (and .env) depends on"""
+    return sorted(
+        name for name in dirscan.listing(directory)
+        if name.endswith(('.conf', '.cfg')) or name in ('__init__.py', '.env')
+    )
+
+
+def directory_stamp(directory) -> dict:
+    # Not the mtime of the directory, which changes with any entry e.g. the lockfile itself
+    return {'path': os.fspath(directory), 'names': discovered_names(directory)}
+
+
+def is_fresh(stamp: dict) -> bool:
+    if 'names' in stamp:
+        return discovered_names(stamp['path']) == stamp['names']
+    if stamp.get('missing'):
+        return not os.path.exists(stamp['path'])
+    return cache.is_fresh(stamp)
+
+
+def encode(value):
+    """value as json, the schema's caster restores the type when loading"""
+    if isinstance(value, enum.Enum):
+        return encode(value.value)
+    if isinstance(value, PurePath):
+        return os.fspath(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted((encode(item) for item in value), key=repr)
+    if isinstance(value, (list, tuple)):
+        return [encode(item) for item in value]
+    if isinstance(value, dict):
+        return {key: encode(item) for key, item in value.items()}
+    return value
+
+
+def secret_fields(registry) -> list:
+    """The fields with an entry in the password store, whose values aren't locked"""
+    from clima import password_store
+
+    return [field for field in registry if field in password_store.index()]
+
+
+def resolve_values(_schema, registry) -> dict:
+    """The values of the environment, .env and the config file, in that order of precedence"""
+    from clima import env
+
+    return {
+        **_schema._get_configfile_asdict(),
+        **schema.cast_fields(registry, env.get_env(_schema)),
+        **schema.cast_fields(registry, env.get_environment(_schema)),
+    }
+
+
+def resolve(_schema, registry) -> dict:
+    """The values of the environment, .env and the config file (in that order of precedence) as the content
+    of a lockfile
+    """
+    from clima import configfile, env
+
+    environ = {
+        name: os.environ.get(name)
+        for names in env.environment_names(_schema).values() for name in names
+    }
+    environ['CLIMA_CONFIG'] = os.environ.get('CLIMA_CONFIG')
+
+    env_file, _, dotenv_environ = env.load_env(_schema)
+    environ.update(dotenv_environ)
+
+    probed = []
+    config_path = configfile.get_config_path(_schema, probed)
+    sources = [env_file]
+    if config_path is not None:
+        sources.append(config_path)
+
+    unlocked = secret_fields(registry)
+    values = resolve_values(_schema, registry)
+
+    return {
+        'format': FORMAT,
+        'schema': schema_id(_schema),
+        'fields': list(registry),
+        'inputs': inputs(_schema),
+        'environ': environ,
+        'sources': [
+            *(directory_stamp(directory) for directory in dict.fromkeys(probed)),
+            *(source_stamp(source) for source in dict.fromkeys(os.path.abspath(source) for source in sources)),
+        ],
+        'values': {field: value for field, value in values.items() if field not in unlocked},
+    }
+
+
+def load(path, _schema, registry):
+    """The locked values, or None if the lockfile is missing or outdated"""
+    try:
+        with open(path, 'r', encoding='UTF-8') as rf:
+            lock = json.load(rf)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(lock, dict) or lock.get('format') != FORMAT:
+        return None
+    if lock.get('schema') != schema_id(_schema) or lock.get('fields') != list(registry) \
+            or lock.get('inputs') != inputs(_schema):
+        return None
+    if any(os.environ.get(name) != value for name, value in lock['environ'].items()):
+        return None
+    if not all(is_fresh(stamp) for stamp in lock['sources']):
+        return None
+
+    try:
+        return schema.cast_fields(registry, lock['values'])
+    except validation.ValidationError:
+        return None
+
+
+def write(path, lock: dict):
+    """Write the lockfile. Failing to write is not an error, the values are resolved again on the next run."""
+    directory = os.path.dirname(os.path.abspath(path))
+    tmp_path = None
+    try:
+        content = json.dumps({**lock, 'values': encode(lock['values'])}, indent=2)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='UTF-8') as wf:
+            wf.write(content)
+        os.replace(tmp_path, path)
+    except (OSError, TypeError, ValueError):
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def get_locked(path, _schema, registry) -> dict:
+    """The values in the lockfile at path, resolving and writing them first if it's missing or outdated"""
+    values = load(path, _schema, registry)
+    if values is None:
+        lock = resolve(_schema, registry)
+        write(path, lock)
+        values = lock['values']
+
+    return values
+
+
+def get_unlocked(_schema, registry) -> dict:
+    """The values of the fields left out of the lockfile (see secret_fields), resolved as usual"""
+    unlocked = secret_fields(registry)
+    if not unlocked:
+        return {}
+
+    values = resolve_values(_schema, registry)
+    return {field: values[field] for field in unlocked if field in values}
@@ -0,0 +1,60 @@
+"""Manifest of the Cli and Schema classes
+
+The manifest is the compiled description of a cli: the schema's fields and
+their help (type, default, description) and the names of the subcommands.
+Deriving it requires reading and parsing the source, so it is cached (see
+clima.cache) keyed on the defining files. Warm runs map the arguments and
+format the help from it directly, while the docstrings and signatures of the
+subcommands are read from the methods (and only when the help is rendered).
+"""
+import os
+import sys
+
+from clima import docstring
+
+NAMESPACE = 'manifest'
+
+# Bumped when the contents of the manifest change, e.g. the order of the fields
+FORMAT = 3
+
+
+def source_file(cls):
+    """Path of the file defining cls, if it has one"""
+    module = sys.modules.get(cls.__module__)
+    path = getattr(module, '__file__', None)
+    return os.path.abspath(path) if path else None
+
+
+def describe(cli, schema) -> dict:
+    """Introspects the Cli class and the schema into a json serializable manifest"""
+    try:
+        help_table = docstring.help_table(schema)
+    except (OSError, TypeError):
+        # Source not available e.g. when defined in an interactive session
+        help_table = {}
+
+    return {
+        'fields': [field for field in schema._fields if field != 'post_init'],
+        'help': help_table,
+        'commands': docstring.list_commands(cli),
+    }
+
+
+def get(cli, schema) -> dict:
+    """Manifest for the Cli class and the schema, from the cache if the sources are unchanged"""
+    from clima import cache
+
+    schema_cls = type(schema)
+    sources = [source_file(cli), source_file(schema_cls)]
+    if None in sources:
+        return describe(cli, schema)
+
+    # The attribute names guard against fields added dynamically e.g. in Schema.post_init
+    key = '{}|{}:{}|{}:{}|{}'.format(
+        FORMAT, sources[0], cli.__qualname__, sources[1], schema_cls.__qualname__, ','.join(vars(schema_cls)))
+    manifest = cache.load(NAMESPACE, key)
+    if manifest is None:
+        manifest = describe(cli, schema)
+        cache.store(NAMESPACE, key, manifest, sources=set(sources))
+
+    return manifest
@@ -1,45 +1,92 @@
-import glob
-
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from subprocess import check_output
+from subprocess import DEVNULL, SubprocessError, check_output, run
 
 PW_STORE_PATH = str(Path.home() / ".password-store")
 
+# Concurrent gpg processes at most, when decrypting several secrets
+DEFAULT_CONCURRENCY = 1
 
-def get_gpg_id(rel_p, mapped_gpg_ids):
-    # print(f'looking for gpg-id in {rel_p}')
-    if rel_p not in mapped_gpg_ids:
-        if len(rel_p) > 2:
-            return get_gpg_id(str(Path(rel_p).parent), mapped_gpg_ids)
-        else:
-            print(f'Could not find gpg-id for {rel_p}')
-    else:
-        return mapped_gpg_ids[rel_p]
+NAMESPACE = 'password-store'
 
+# password store path -> {name: (path, gpg_id)}, see index()
+INDEXES = {}
 
-def map_gpg_id():
-    mapped_gpg_ids = {}
-    for f in glob.glob(f'{PW_STORE_PATH}/**/.gpg-id', recursive=True):
-        p = Path(f)
-        with open(f, 'r', encoding='UTF-8') as id_file:
-            mapped_gpg_ids.update({str(Path(get_rel_p(f)).parent): id_file.read().strip()})
 
-    return mapped_gpg_ids
+def walk_store(root):
+    """Walks the password store once, resolving the nearest .gpg-id for each entry
 
+    Hidden files and directories (e.g. .git) are skipped. When a name is found
+    more than once, the first one found wins, the files of a directory before
+    its subdirectories.
 
-def get_rel_p(p):
-    return str(p).replace(PW_STORE_PATH + '/', '')
+    Returns:
+        ({name: (path, gpg_id)}, [directories walked], [.gpg-id files found])
+    """
+    entries = {}
+    directories = []
+    gpg_id_files = []
 
+    # Depth first, the entries of each directory in name order
+    stack = [(os.fspath(root), None)]
+    while stack:
+        directory, gpg_id = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                dir_entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            continue
+        directories.append(directory)
 
-CACHED_IDS = map_gpg_id()
+        for entry in dir_entries:
+            if entry.name == '.gpg-id':
+                with open(entry.path, 'r', encoding='UTF-8') as id_file:
+                    gpg_id = id_file.read().strip()
+                gpg_id_files.append(entry.path)
 
+        subdirectories = []
+        for entry in dir_entries:
+            if entry.name.startswith('.'):
+                continue
+            if entry.is_dir():
+                subdirectories.append((entry.path, gpg_id))
+            elif entry.name.endswith('.gpg'):
+                entries.setdefault(entry.name[:-len('.gpg')], (entry.path, gpg_id))
 
-def test_keymapping():
-    mapped_gpg_ids = map_gpg_id()
+        stack.extend(reversed(subdirectories))
 
-    for f in glob.glob(f'{PW_STORE_PATH}/**/*.gpg', recursive=True):
-        rp = get_rel_p(f)
-        print(f'{rp} id -> {get_gpg_id(rp, mapped_gpg_ids)}')
+    return entries, directories, gpg_id_files
+
+
+def index():
+    """Index of the password store as {name: (path, gpg_id)}
+
+    The index is built in a single walk and persisted in the cache (see clima.cache). It's
+    valid as long as none of the directories (i.e. their entries) nor the .gpg-id files change.
+    """
+    if PW_STORE_PATH not in INDEXES:
+        from clima import cache
+
+        cached = cache.load(NAMESPACE, PW_STORE_PATH)
+        if cached is not None:
+            INDEXES[PW_STORE_PATH] = {name: tuple(entry) for name, entry in cached.items()}
+        else:
+            entries, directories, gpg_id_files = walk_store(PW_STORE_PATH)
+            cache.store(NAMESPACE, PW_STORE_PATH, entries, sources=[*directories, *gpg_id_files])
+            INDEXES[PW_STORE_PATH] = entries
+
+    return INDEXES[PW_STORE_PATH]
+
+
+def get_rel_p(p):
+    return str(p).replace(PW_STORE_PATH + '/', '')
+
+
+def test_keymapping():
+    for name, (path, gpg_id) in index().items():
+        print(f'{get_rel_p(path)} id -> {gpg_id}')
 
 
 def decrypt_file_with_id(gpg_file, gpg_id) -> str:
@@ -53,34 +100,180 @@ def decrypt_file_with_id(gpg_file, gpg_id) -> str:
     return result.strip()
 
 
+def runtime_dir():
+    """$XDG_RUNTIME_DIR if available, which is private to the user and typically in memory"""
+    runtime = os.environ.get('XDG_RUNTIME_DIR')
+    return runtime if runtime and os.path.isdir(runtime) else None
+
+
+def decrypt_files(gpg_files) -> list:
+    """Decrypts the gpg_files with a single gpg process (`gpg --decrypt-files`)
+
+    gpg writes the decrypted files next to the encrypted ones, so the files are symlinked into a
+    private temporary directory (mode 0700) in $XDG_RUNTIME_DIR, which is removed right after reading
+    the results. Without $XDG_RUNTIME_DIR, this refuses to run instead of writing the plaintext secrets
+    in the system's temporary directory, which may be on disk.
+
+    Returns:
+        [secret or None for each of the gpg_files]
+
+    Raises:
+        OSError: if $XDG_RUNTIME_DIR is not available
+    """
+    runtime = runtime_dir()
+    if runtime is None:
+        raise OSError('$XDG_RUNTIME_DIR is not available for the decrypted files')
+
+    with tempfile.TemporaryDirectory(prefix='clima-', dir=runtime) as tmp:
+        links = []
+        for i, gpg_file in enumerate(gpg_files):
+            link = os.path.join(tmp, f'{i}.gpg')
+            os.symlink(os.path.abspath(gpg_file), link)
+            links.append(link)
+
+        cmd = ['gpg', '--quiet', '--batch', '--yes', '--decrypt-files', *links]
+        run(cmd, stdout=DEVNULL, stderr=DEVNULL, check=False)
+
+        results = []
+        for link in links:
+            try:
+                with open(link[:-len('.gpg')], 'r', encoding='UTF-8') as rf:
+                    results.append(rf.read().strip() or None)
+            except OSError:
+                results.append(None)
+
+    return results
+
+
 def decrypt(keyname):
     result = ''
-    for f in glob.glob(f'{PW_STORE_PATH}/**/*.gpg', recursive=True):
-        this_name = Path(f).stem
-        if this_name == keyname:
-            rp = get_rel_p(f)
-            gpg_id = get_gpg_id(rp, CACHED_IDS)
-            result = decrypt_file_with_id(f, gpg_id)
-            break
+    entry = index().get(keyname)
+    if entry is not None:
+        gpg_file, gpg_id = entry
+        if gpg_id is None:
+            print(f'Could not find gpg-id for {get_rel_p(gpg_file)}')
+        result = decrypt_file_with_id(gpg_file, gpg_id)
 
     return result
 
 
-def get_secrets(configuration_tuple):
-    params = [t for t in configuration_tuple._asdict()]
-    secrets = {}
+def decrypt_secret(keyname):
+    """Decrypted secret for keyname or None, if there's none (or it couldn't be decrypted)"""
     try:
-        for p in params:
-            secret = decrypt(p)
-            if len(secret) > 0:
-                secrets.update({p: secret})
-    except:
+        secret = decrypt(keyname)
+    except Exception:
         # TODO: Wanted to keep this lean, as one might not have gpg installed and what not..
         # Need to provide for example a configuration key 'use gpg' that the user can use to
         # enable this feature. This way it won't get in the way of other use cases.
-        pass
+        return None
+
+    return secret if len(secret) > 0 else None
+
+
+def is_batch() -> bool:
+    """Decrypt several secrets with a single gpg process, enabled with $CLIMA_GPG_BATCH"""
+    return bool(os.environ.get('CLIMA_GPG_BATCH'))
+
+
+def concurrency() -> int:
+    """Max number of concurrent gpg processes, defined with $CLIMA_GPG_CONCURRENCY"""
+    try:
+        return max(1, int(os.environ.get('CLIMA_GPG_CONCURRENCY', DEFAULT_CONCURRENCY)))
+    except ValueError:
+        return DEFAULT_CONCURRENCY
+
+
+def get_secret(keyname):
+    """Secret for keyname or None, if there's none (or it couldn't be decrypted)"""
+    return get_secrets_for([keyname]).get(keyname)
+
+
+def get_secrets_for(keynames, max_workers=None) -> dict:
+    """Secrets of keynames, from the agent (see clima.agent) if one is running, otherwise
+    decrypted in a batch or up to max_workers (see concurrency()) at a time.
+
+    A failure only affects its own key.
+
+    Returns:
+        {keyname: secret or None}
+    """
+    from clima import agent
+
+    keynames = [keyname for keyname in keynames if keyname in index()]
+    if not agent.is_enabled():
+        return decrypt_secrets(keynames, max_workers=max_workers)
+
+    gpg_files = {keyname: index()[keyname][0] for keyname in keynames}
+    cached = agent.get(gpg_files.values())
+    secrets = {keyname: secret for keyname, secret in zip(keynames, cached) if secret is not None}
+
+    # The modification time before decrypting, so that a file changed meanwhile won't be cached as is
+    misses = {keyname: agent.mtime_ns(gpg_files[keyname]) for keyname in keynames if keyname not in secrets}
+    decrypted = decrypt_secrets(list(misses), max_workers=max_workers)
+    agent.put([
+        (gpg_files[keyname], secret, misses[keyname])
+        for keyname, secret in decrypted.items()
+        if secret is not None and misses[keyname] is not None
+    ])
+
+    secrets.update(decrypted)
+    return {keyname: secrets[keyname] for keyname in keynames}
+
+
+def decrypt_secrets(keynames, max_workers=None) -> dict:
+    """Decrypts the secrets of keynames in a batch or up to max_workers (see concurrency()) at a time
+
+    Returns:
+        {keyname: secret or None}
+    """
+    max_workers = max_workers or concurrency()
+
+    if is_batch() and len(keynames) > 1:
+        return get_secrets_batch(keynames)
+
+    if max_workers == 1 or len(keynames) < 2:
+        return {keyname: decrypt_secret(keyname) for keyname in keynames}
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(keynames))) as executor:
+        return dict(zip(keynames, executor.map(decrypt_secret, keynames)))
+
+
+def get_secrets_batch(keynames) -> dict:
+    """Decrypts the secrets of keynames with a single gpg process (see decrypt_files).
+    The secrets the batch fails to decrypt are decrypted one by one, as are all of them
+    without $XDG_RUNTIME_DIR.
+
+    Returns:
+        {keyname: secret or None}
+    """
+    gpg_files = [index()[keyname][0] for keyname in keynames]
+    try:
+        secrets = decrypt_files(gpg_files)
+    except (OSError, SubprocessError):
+        secrets = [None] * len(keynames)
+
+    return {
+        keyname: secret if secret is not None else decrypt_secret(keyname)
+        for keyname, secret in zip(keynames, secrets)
+    }
+
+
+def prefetch_enabled() -> bool:
+    """Whether several secrets are decrypted at once (concurrently or in a batch).
+
+    The subcommand's fields aren't known up front, so the first secret read decrypts the secrets of all the
+    fields not defined in the layers above the password store, including those the subcommand never reads.
+    This pays off when most of them are read. For a subcommand reading a single secret, decrypting on
+    demand (the default) runs fewer gpg processes.
+    """
+    return is_batch() or concurrency() > 1
+
+
+def get_secrets(configuration_tuple, max_workers=None):
+    params = [t for t in configuration_tuple._asdict()]
+    secrets = get_secrets_for(params, max_workers=max_workers)
 
-    return secrets
+    return {p: secret for p, secret in secrets.items() if secret is not None}
 
 
 def test_decrypt():
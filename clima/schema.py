@@ -1,21 +1,90 @@
-import configparser
 import inspect
 import sys
-from importlib import metadata
+from types import MappingProxyType
+from typing import Any, Callable, NamedTuple
 # Until poetry fixes this https://github.com/python-poetry/poetry/issues/144
 # This hack is necessary to report correct __version__
 # inside the project
 # Version printing part 0
 from pathlib import Path
 
+from clima import dirscan, timings, validation
+
+
+class Field(NamedTuple):
+    """A field of a schema, see MetaSchema"""
+    name: str
+    # The type annotation or None
+    annotation: Any
+    # The default value as defined in the class (after casting)
+    default: Any
+    # Casts a value as annotated, see validation.compile_caster
+    caster: Callable
+    # Position in the order of definition, the base classes' fields first
+    position: int
+
+
+def is_field(name, value) -> bool:
+    """Public class attributes, except methods and other descriptors, are fields"""
+    return not name.startswith('_') and not (
+        inspect.isfunction(value)
+        or inspect.ismethod(value)
+        or isinstance(value, (staticmethod, classmethod, property, LazyVersion))
+    )
+
+
+def cast_field(registry, name, value):
+    """value cast with the caster of the field name, if it is one (None is kept as is)
+
+    Raises:
+        ValidationError: if the value doesn't match the field's annotation
+    """
+    field = registry.get(name)
+    if field is None or value is None:
+        return value
+
+    try:
+        return field.caster(value)
+    except validation.ValidationError as ex:
+        raise ex.at(name) from None
+
+
+def cast_fields(registry, values: dict) -> dict:
+    return {name: cast_field(registry, name, value) for name, value in values.items()}
+
+
+def field_registry(cls) -> MappingProxyType:
+    """The fields of cls and its bases as a read-only {name: Field} in the order of definition"""
+    annotations = {}
+    defined = {}
+    for klass in reversed(cls.__mro__):
+        if klass is object:
+            continue
+        annotations.update(klass.__dict__.get('__annotations__', {}))
+        for name, value in klass.__dict__.items():
+            if is_field(name, value):
+                defined[name] = value
+            else:
+                # E.g. a method overriding a field
+                defined.pop(name, None)
+
+    registry = {}
+    for position, (name, default) in enumerate(defined.items()):
+        annotation = annotations.get(name)
+        registry[name] = Field(name, annotation, default, validation.compile_caster(annotation), position)
+
+    return MappingProxyType(registry)
+
+
+def fields(obj) -> MappingProxyType:
+    """The field registry of a schema class or instance"""
+    cls = obj if isinstance(obj, type) else type(obj)
+    return cls.__dict__['_field_registry']
+
 
 def asdict(obj):
     """Helper to create a dictionary out of the class attributes (fields/variables)"""
-    obj_dict = obj.__class__.__dict__
-    return {k: getattr(obj, k) for k, v in obj_dict.items()
-            if not k.startswith('_')
-            and not inspect.isfunction(v)
-            and not inspect.ismethod(v)}
+    return {name: getattr(obj, name) for name in fields(obj)}
 
 
 def schema_decorator(decorators_state, cls):
@@ -24,68 +93,117 @@ def schema_decorator(decorators_state, cls):
     return cls
 
 
-def get_importing_frame():
-    piece = inspect.stack()[0]
-    for frame in inspect.getouterframes(piece.frame):
-        code_context = frame.code_context
-        if isinstance(code_context, list):
-            code = code_context[0]
-            if 'clima' in code and 'import' in code and 'core' not in code:
-                return frame
+def importer_package(module_name):
+    """Top level package of the module (that defines the schema), without inspecting the stack.
+    For a script, the directory is assumed to be the package, if it is one.
+    """
+    module = sys.modules.get(module_name)
+    spec = getattr(module, '__spec__', None)
+    if spec is not None and spec.name != '__main__':
+        return spec.name.split('.')[0]
+
+    module_file = getattr(module, '__file__', None)
+    if module_file is not None and dirscan.is_file(Path(module_file).parent / '__init__.py'):
+        return Path(module_file).parent.name
+
+    return None
+
 
+def deduce_importer_version(module_name):
+    """Version of the installed distribution providing the module.
 
-def deduce_importer_version():
-    """experimental way of deducing the version from the package that
-    imports clima
+    Returns:
+        (version, path to the distribution's metadata or None)
     """
-    from importlib import util
-    version = None
+    from importlib import metadata
+
+    package = importer_package(module_name)
+    if package is None:
+        return None, None
+
     try:
-        frame = get_importing_frame()
-        p = Path(frame.filename)
-        parent = str(p.parent.name)
-        importer_package = None
-        while importer_package is None:
-            spec = util.find_spec(parent)
-            if hasattr(spec, 'name'):
-                importer_package = spec.name
-        version = metadata.version(importer_package)
-    except:
-        pass
+        dist = metadata.distribution(package)
+    except metadata.PackageNotFoundError:
+        # The distribution might be named differently than the package (python >= 3.10)
+        dist_names = getattr(metadata, 'packages_distributions', dict)().get(package, [])
+        if len(dist_names) == 0:
+            return None, None
+        dist = metadata.distribution(dist_names[0])
 
-    return version
+    # METADATA (PKG-INFO for eggs), if the installed files are recorded
+    metadata_path = next(
+        (dist.locate_file(file) for file in dist.files or () if file.name in ('METADATA', 'PKG-INFO')), None
+    )
+    return dist.version, metadata_path
 
 
 def parse_version_from_pyproject_toml():
     toml = Path('pyproject.toml')
     version = None
-    if toml.exists():
+    if dirscan.is_file(toml):
+        import configparser
         parser = configparser.ConfigParser()
-        parser.read(toml)
+        try:
+            parser.read(toml)
+            tool_section = parser['tool.poetry']
+        except (configparser.Error, KeyError):
+            return None
 
-        tool_section = parser['tool.poetry']
         if 'version' in tool_section:
             quoted = tool_section['version']
             version = quoted.replace('"', '')
     return version
 
 
-def get_pkg_version():
+# Resolved versions of this process, module name -> version
+VERSIONS = {}
+
+
+def get_pkg_version(module_name='__main__'):
     # Version printing part 1
     # Enables version printing out of the box
     # Idea is, that when poetry is used, this will look up the version
     # in its configuration.
+    if module_name in VERSIONS:
+        return VERSIONS[module_name]
+
+    from clima import cache
 
-    if (version := deduce_importer_version()) is not None:
-        pass
-    elif (version := parse_version_from_pyproject_toml()) is not None:
-        pass
-    else:
-        version = '0.0.1'
+    module_file = getattr(sys.modules.get(module_name), '__file__', None)
+    key = f'{module_name}:{module_file}:{Path.cwd()}'
+    version = cache.load('version', key)
 
+    if version is None:
+        sources = [module_file]
+
+        version, dist_metadata = deduce_importer_version(module_name)
+        if version is not None:
+            sources.append(dist_metadata)
+        elif (version := parse_version_from_pyproject_toml()) is not None:
+            sources.append(Path('pyproject.toml').absolute())
+        else:
+            version = '0.0.1'
+            # Not cached, as adding pyproject.toml or installing the package wouldn't invalidate the entry
+            sources = None
+
+        # Only files can invalidate the entry e.g. interactive sessions have none
+        if sources is not None and None not in sources:
+            cache.store('version', key, version, sources=sources)
+
+    VERSIONS[module_name] = version
     return version
 
 
+class LazyVersion:
+    """Resolves the version of the package defining the schema on first access,
+    since it's only needed for `<cmd> version` or reading `c.version`
+    """
+
+    def __get__(self, obj, owner):
+        with timings.phase('get_pkg_version'):
+            return get_pkg_version(owner.__module__)
+
+
 def is_iterable(value):
     iterables = [tuple, list, set]
 
@@ -110,48 +228,46 @@ class MetaSchema(type):
     """
 
     def __new__(mcs, name, bases, namespace, **kwds):
-        cls = type.__new__(mcs, name, bases, namespace)
+        with timings.phase(f'MetaSchema.__new__ ({name})'):
+            cls = type.__new__(mcs, name, bases, namespace)
 
-        # post init hook
-        cls.post_init(cls)
+            # post init hook
+            cls.post_init(cls)
 
-        # Parsing type descriptors
-        if '__annotations__' in namespace:
-            for attr, t in namespace['__annotations__'].items():
-                # Validation
-                try:
-                    value = namespace[attr]
-                    schema_value = getattr(cls, attr)
+            setattr(cls, 'version', LazyVersion())
 
-                    # TODO: Nested types. This only wraps a single iterable
+            if 'env_prefix' in kwds:
+                cls._env_prefix = kwds['env_prefix']
 
-                    if should_wrap_as_list(value, t):
-                        value = [value]
+            # Compiled once, e.g. for Schema._fields, Schema._asdict and casting
+            registry = dict(field_registry(cls))
 
-                    if should_wrap_as_list(schema_value, t):
-                        schema_value = [schema_value]
+            # Type casting the defaults (the inherited ones are cast already)
+            for attr in namespace.get('__annotations__', {}):
+                field = registry.get(attr)
+                if field is None or field.default is None:
+                    continue
 
-                    # Type casting
-                    if t(value) == t(schema_value):
-                        if getattr(cls, attr) is not None:
-                            setattr(cls, attr, t(value))
-                    else:
-                        setattr(cls, attr, t(schema_value))
+                try:
+                    default = field.caster(field.default)
                 except TypeError as ex:
                     print('given parameters or defined defaults were of incorrect type:')
                     # print(f'{cls.__qualname__}.{ann} -> {ex.args}')  # f-strings require >=3.6
                     print('{}.{} -> {}'.format(cls.__qualname__, attr, ex.args))
                     sys.exit(1)
 
-        setattr(cls, 'version', get_pkg_version())
+                setattr(cls, attr, default)
+                registry[attr] = field._replace(default=default)
+
+            cls._field_registry = MappingProxyType(registry)
 
-        # TODO: Maybe check that given parameters matched the schema?
-        # Even a fuzzy search to suggest close matches
+            # TODO: Maybe check that given parameters matched the schema?
+            # Even a fuzzy search to suggest close matches
 
-        # Wrap schema with c (configuration decorator
-        cls._wrap(cls)
+            # Wrap schema with c (configuration decorator
+            cls._wrap(cls)
 
-        return cls
+            return cls
 
     def __init__(cls, name, bases, namespace, **kwds):
         super().__init__(name, bases, namespace)
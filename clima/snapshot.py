@@ -0,0 +1,89 @@
+"""Frozen snapshots of the configuration
+
+Reading `c.<field>` goes through Configurable.__getattr__ and the lazily
+resolved layers on every access. For hot loops, `clima.freeze()` gives an
+immutable object of a class generated per schema, with a slot per field.
+Reading a field is then a plain attribute access:
+
+    conf = clima.freeze()
+    for record in records:
+        process(record, conf.threshold)
+
+The values resolved so far are copied into the slots. The others are resolved
+on their first access, like the layers are, so that freezing doesn't e.g.
+decrypt the secrets the command never reads. A required field without a value
+stays unset, so reading it raises RequiredParameterException like `c` does. The
+version is read from the schema on access, as resolving it isn't free.
+"""
+from clima import schema
+
+# (schema class, names) -> generated snapshot class
+CLASSES = {}
+
+
+class Snapshot:
+    """Base of the generated snapshot classes"""
+    # The resolved configuration (layers.Resolved) the unset fields are read from
+    __slots__ = ('_resolved',)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'The configuration is frozen, can\'t set "{name}"')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'The configuration is frozen, can\'t delete "{name}"')
+
+    def __getattr__(self, name):
+        # Only called when the slot is unset (or there's no such field), not when reading a value
+        from clima.core import RequiredParameterException
+
+        if name not in type(self).__slots__:
+            raise AttributeError(f'{type(self).__name__!r} has no field {name!r}')
+
+        value = object.__getattribute__(self, '_resolved').get(name)
+        if value is None:
+            raise RequiredParameterException(f'Missing argument for "{name}"')
+
+        object.__setattr__(self, name, value)
+        return value
+
+    def _asdict(self) -> dict:
+        """The fields with a value, resolving the rest"""
+        from clima.core import RequiredParameterException
+
+        result = {}
+        for name in type(self).__slots__:
+            try:
+                result[name] = getattr(self, name)
+            except RequiredParameterException:
+                pass
+        return result
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self._asdict()!r})'
+
+
+def snapshot_class(schema_cls, names) -> type:
+    """Snapshot class with a slot for each of names, generated once per schema class"""
+    key = (schema_cls, tuple(names))
+    if key not in CLASSES:
+        CLASSES[key] = type(f'Frozen{schema_cls.__name__}', (Snapshot,), {
+            '__slots__': tuple(names),
+            '__module__': schema_cls.__module__,
+            '__qualname__': f'Frozen{schema_cls.__qualname__}',
+            'version': property(lambda self: schema_cls.version),
+        })
+
+    return CLASSES[key]
+
+
+def freeze(resolved, schema_obj) -> Snapshot:
+    """Snapshot of the fields of schema_obj (and the names set in Cli.post_init) with the values resolved so far"""
+    names = [*schema.fields(schema_obj), *(name for name in resolved.overridden if name != 'version')]
+    names = list(dict.fromkeys(names))
+    frozen = object.__new__(snapshot_class(type(schema_obj), names))
+    object.__setattr__(frozen, '_resolved', resolved)
+    for name, value in resolved.loaded().items():
+        if name in names and value is not None:
+            object.__setattr__(frozen, name, value)
+
+    return frozen
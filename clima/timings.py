@@ -0,0 +1,67 @@
+"""Startup phase timings
+
+Phases are always recorded as a pair of monotonic timestamps, which costs
+next to nothing. They are only formatted and printed when the Fire flag
+`--timings` is given:
+
+    my_tool sub -- --timings              # table to stderr
+    my_tool sub -- --timings json         # json to stderr
+    my_tool sub -- --timings timings.json # json written to a file
+"""
+import sys
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Reference point for the offsets, i.e. roughly when clima was imported
+T0 = time.perf_counter()
+
+# Bounded, so that long running processes (e.g. test suites) don't accumulate records
+RECORDS = deque(maxlen=1024)
+
+
+@contextmanager
+def phase(name):
+    """Record the duration of the wrapped block as a named phase"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        RECORDS.append((name, start, time.perf_counter()))
+
+
+def as_dicts():
+    return [
+        {
+            'phase': name,
+            'start_ms': round((start - T0) * 1000, 3),
+            'duration_ms': round((end - start) * 1000, 3),
+        }
+        for name, start, end in sorted(RECORDS, key=lambda record: record[1])
+    ]
+
+
+def as_table():
+    from clima.utils import format_table
+
+    rows = [['phase', 'start (ms)', 'duration (ms)']]
+    rows += [[d['phase'], f"{d['start_ms']:.2f}", f"{d['duration_ms']:.2f}"] for d in as_dicts()]
+    return format_table(rows)
+
+
+def report(output='table', file=None):
+    """Print the recorded phases as a table or json, or write json to the file path given in output"""
+    import json
+
+    file = file if file is not None else sys.stderr
+    if output == 'table':
+        print(as_table(), file=file)
+    elif output == 'json':
+        print(json.dumps(as_dicts(), indent=2), file=file)
+    else:
+        with open(output, 'w', encoding='UTF-8') as wf:
+            json.dump(as_dicts(), wf, indent=2)
+
+
+def clear():
+    RECORDS.clear()
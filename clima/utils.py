@@ -3,27 +3,29 @@ import traceback
 from contextlib import contextmanager
 from pathlib import Path
 
-from tabulate import tabulate
-
 
 def filter_fields(d: dict, nt):
     """Excludes fields not found in the schema/namedtuple"""
-    res = {}
-    for k, v in d.items():
-        if k in nt._fields:
-            res.update({k: v})
-
-    return res
+    fields = set(nt._fields)
+    return {k: v for k, v in d.items() if k in fields}
 
 
 def type_correct_with(cdict, cfg_tuple):
-    """Use type hints of the cfg tuple to cast parameters i.e. attributes into their intended types"""
-    # TODO: This would be cleaner, if the config would use Schema or derivative in the
-    # first place and use its validation process
+    """Use type hints of the cfg tuple to cast parameters i.e. attributes into their intended types.
+    Fields without type hints are cast as their default values.
+    """
+    from clima import schema
+
+    registry = schema.fields(cfg_tuple)
     res = {}
     for k, v in cdict.items():
-        typename = getattr(cfg_tuple, k)
-        res.update({k: type(typename)(v)})
+        field = registry.get(k)
+        if field is not None and field.annotation is not None:
+            res[k] = field.caster(v)
+        elif field is not None and field.default is None:
+            res[k] = v
+        else:
+            res[k] = type(getattr(cfg_tuple, k))(v)
     return res
 
 
@@ -83,13 +85,29 @@ def suppress_traceback():
         truncated_error_table.append(
             [f'{tb_filename}:{tb.lineno}', sep[0], f'{tb.name}()', sep[1], tb.line, sep[2], f'{error_name}'])
 
-        print(tabulate(truncated_error_table, tablefmt='plain'))
+        print(format_table(truncated_error_table))
         print()
         print(exception_desc)
 
         sys.exit(1)
 
 
+def format_table(rows):
+    """Plain table formatting with tabulate, if installed (clima[tabulate])"""
+    try:
+        from tabulate import tabulate
+    except ImportError:
+        columns = max(len(row) for row in rows)
+        widths = [max(len(str(row[i])) for row in rows if i < len(row)) for i in range(columns)]
+        lines = []
+        for row in rows:
+            cells = [str(cell).ljust(width) for cell, width in zip(row, widths)]
+            lines.append('  '.join(cells).rstrip())
+        return '\n'.join(lines)
+
+    return tabulate(rows, tablefmt='plain')
+
+
 def chain_get(*args, fail=False):
     """Chain multiple functions together, that return something or None.
     The first function to return non-None will be used to return the output.
@@ -0,0 +1,285 @@
+"""Validating and casting values as annotated
+
+Each annotation of a schema is compiled once into a cast function (see
+compile_caster), which validates and casts a value in a single call. Besides plain
+types (int, str, bool, Path...), the typing generics are supported and can be
+nested, e.g.
+
+    List[int], Tuple[int, ...], Tuple[int, str], Dict[str, float], Set[Path]
+    Optional[Path], Union[int, str], Literal['dev', 'prod'], an Enum subclass
+
+A single value given to a container is wrapped instead of split ('VST' ->
+['VST']). The members of a union are tried in order, except that a value
+already of a member's type (other than str) is kept as is.
+
+The compiled cast functions are cached by annotation (see COMPILED), so that
+defining the same annotations again (e.g. in tests) doesn't compile them again.
+A value failing to validate raises ValidationError, telling where and why:
+
+    ValidationError: ports[1]: expected int, got 'x'
+"""
+import collections.abc
+import enum
+import types
+import typing
+from pathlib import PurePath
+from typing import Any, Callable
+
+# annotation -> compiled cast function
+COMPILED = {}
+
+ITERABLE_TYPES = (tuple, list, set)
+
+# Strings cast as bools (case insensitive)
+TRUE_STRINGS = ('true', 'yes', 'on', '1')
+FALSE_STRINGS = ('false', 'no', 'off', '0', '')
+
+# Abstract containers and the types they are cast as
+CONTAINER_TYPES = {
+    list: list,
+    set: set,
+    frozenset: frozenset,
+    collections.abc.Sequence: list,
+    collections.abc.MutableSequence: list,
+    collections.abc.Iterable: list,
+    collections.abc.Collection: list,
+    collections.abc.Set: set,
+    collections.abc.MutableSet: set,
+}
+
+MAPPING_TYPES = (dict, collections.abc.Mapping, collections.abc.MutableMapping)
+
+Annotated = getattr(typing, 'Annotated', None)
+# `int | None` (python >= 3.10)
+UnionType = getattr(types, 'UnionType', None)
+
+
+class ValidationError(TypeError, ValueError):
+    """A value that doesn't match its annotation. The path tells where, e.g. `field[0]`."""
+
+    def __init__(self, message, path=''):
+        super().__init__(f'{path}: {message}' if path else message)
+        self.message = message
+        self.path = path
+
+    def at(self, segment) -> 'ValidationError':
+        """The same error, one level up in the path (a field name or an index like [0])"""
+        return ValidationError(self.message, f'{segment}{self.path}')
+
+
+def type_name(annotation) -> str:
+    return getattr(annotation, '__name__', None) or str(annotation).replace('typing.', '')
+
+
+def identity(value):
+    return value
+
+
+def cast_bool(value) -> bool:
+    """bool from a bool, a number or strings like 'true', 'yes', '1' and 'false', 'no', '0' (case insensitive)"""
+    if isinstance(value, str):
+        lowered = value.strip().lower()
+        if lowered in FALSE_STRINGS:
+            return False
+        if lowered in TRUE_STRINGS:
+            return True
+        raise ValidationError(f'expected bool, got {value!r}')
+    return bool(value)
+
+
+def compile_caster(annotation) -> Callable:
+    """The cast function of annotation, compiled once per annotation"""
+    try:
+        return COMPILED[annotation]
+    except KeyError:
+        cast = COMPILED[annotation] = compile_annotation(annotation)
+        return cast
+    except TypeError:
+        # Unhashable annotation
+        return compile_annotation(annotation)
+
+
+def compile_annotation(annotation) -> Callable:
+    if annotation is None or annotation is Any or isinstance(annotation, typing.TypeVar):
+        return identity
+
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+
+    if Annotated is not None and origin is Annotated:
+        return compile_caster(args[0])
+    if origin is typing.Union or (UnionType is not None and origin is UnionType):
+        return compile_union(args)
+    if origin is typing.Literal:
+        return compile_literal(args)
+    if origin is tuple:
+        return compile_tuple(args)
+    if origin in MAPPING_TYPES:
+        return compile_mapping(args)
+    if origin in CONTAINER_TYPES:
+        return compile_container(CONTAINER_TYPES[origin], args[0] if args else None)
+
+    if annotation is bool:
+        return cast_bool
+    if annotation in ITERABLE_TYPES:
+        return compile_container(annotation, None)
+    if isinstance(annotation, type) and issubclass(annotation, enum.Enum):
+        return compile_enum(annotation)
+    if isinstance(annotation, type) and issubclass(annotation, PurePath):
+        return compile_scalar(annotation, keep=lambda value: isinstance(value, annotation))
+
+    return compile_scalar(annotation)
+
+
+def compile_scalar(annotation, keep=None) -> Callable:
+    """Casts by calling annotation, unless the value has the type already (or keep(value))"""
+    name = type_name(annotation)
+    if keep is None:
+        def keep(value):
+            return type(value) is annotation
+
+    def cast_scalar(value):
+        if keep(value):
+            return value
+        try:
+            return annotation(value)
+        except ValidationError:
+            raise
+        except (TypeError, ValueError):
+            raise ValidationError(f'expected {name}, got {value!r}') from None
+
+    return cast_scalar
+
+
+def items_of(value) -> list:
+    """The items of an iterable value, or the value itself as the only item"""
+    return list(value) if type(value) in (list, tuple, set, frozenset) else [value]
+
+
+def compile_container(container, item_annotation) -> Callable:
+    cast_item = compile_caster(item_annotation)
+
+    if cast_item is identity:
+        def cast_container(value):
+            if type(value) is container:
+                return value
+            # A single value is wrapped, to prevent surprises such as 'VST' -> ('V', 'S', 'T')
+            return container(items_of(value))
+
+        return cast_container
+
+    def cast_container(value):
+        result = []
+        for i, item in enumerate(items_of(value)):
+            try:
+                result.append(cast_item(item))
+            except ValidationError as ex:
+                raise ex.at(f'[{i}]') from None
+        return container(result)
+
+    return cast_container
+
+
+def compile_tuple(args) -> Callable:
+    if len(args) == 2 and args[1] is Ellipsis:
+        return compile_container(tuple, args[0])
+    if not args or args == ((),):
+        return compile_container(tuple, None)
+
+    casts = [compile_caster(arg) for arg in args]
+
+    def cast_tuple(value):
+        items = items_of(value)
+        if len(items) != len(casts):
+            raise ValidationError(f'expected {len(casts)} items, got {len(items)} ({value!r})')
+
+        result = []
+        for i, (cast, item) in enumerate(zip(casts, items)):
+            try:
+                result.append(cast(item))
+            except ValidationError as ex:
+                raise ex.at(f'[{i}]') from None
+        return tuple(result)
+
+    return cast_tuple
+
+
+def compile_mapping(args) -> Callable:
+    cast_key, cast_value = identity, identity
+    if len(args) == 2:
+        cast_key, cast_value = compile_caster(args[0]), compile_caster(args[1])
+
+    def cast_mapping(value):
+        if not isinstance(value, collections.abc.Mapping):
+            raise ValidationError(f'expected a mapping, got {value!r}')
+
+        result = {}
+        for key, item in value.items():
+            try:
+                result[cast_key(key)] = cast_value(item)
+            except ValidationError as ex:
+                raise ex.at(f'[{key!r}]') from None
+        return result
+
+    return cast_mapping
+
+
+def compile_union(args) -> Callable:
+    optional = type(None) in args
+    members = [arg for arg in args if arg is not type(None)]
+    casts = [compile_caster(member) for member in members]
+    # Values of these types are kept as is
+    exact = tuple(member for member in members if isinstance(member, type) and member is not str)
+    expected = ' or '.join(type_name(arg) for arg in args)
+
+    def cast_union(value):
+        if value is None and optional:
+            return None
+        if type(value) in exact:
+            return value
+
+        for cast in casts:
+            try:
+                return cast(value)
+            except ValidationError:
+                pass
+        raise ValidationError(f'expected {expected}, got {value!r}')
+
+    return cast_union
+
+
+def compile_literal(args) -> Callable:
+    # Strings e.g. from the environment match the values by their str()
+    by_str = {str(arg): arg for arg in reversed(args)}
+    expected = ', '.join(repr(arg) for arg in args)
+
+    def cast_literal(value):
+        for arg in args:
+            if value == arg and type(value) is type(arg):
+                return arg
+        if isinstance(value, str) and value in by_str:
+            return by_str[value]
+        raise ValidationError(f'expected one of {expected}, got {value!r}')
+
+    return cast_literal
+
+
+def compile_enum(annotation) -> Callable:
+    by_str = {str(member.value): member for member in reversed(annotation)}
+    expected = ', '.join(annotation.__members__)
+
+    def cast_enum(value):
+        if isinstance(value, annotation):
+            return value
+        try:
+            return annotation(value)
+        except ValueError:
+            pass
+        if isinstance(value, str):
+            if value in annotation.__members__:
+                return annotation[value]
+            if value in by_str:
+                return by_str[value]
+        raise ValidationError(f'expected one of {expected} ({type_name(annotation)}), got {value!r}')
+
+    return cast_enum
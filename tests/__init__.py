@@ -1,4 +1,14 @@
+import atexit
+import os
+import shutil
 import sys
+import tempfile
+from unittest import mock
+
+# Keep the persistent caches of the test runs out of the user's cache directory
+if 'CLIMA_CACHE_DIR' not in os.environ:
+    os.environ['CLIMA_CACHE_DIR'] = tempfile.mkdtemp(prefix='clima-test-cache-')
+    atexit.register(shutil.rmtree, os.environ['CLIMA_CACHE_DIR'], ignore_errors=True)
 
 from clima.core import Configurable
 
@@ -16,3 +26,16 @@ class SysArgvRestore:
 
     def tearDown(self) -> None:
         self.restore_sysargv()
+
+
+class CacheDirMixin:
+    """Isolated cache directory per test"""
+
+    def setUp(self) -> None:
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.env_patch = mock.patch.dict(os.environ, {'CLIMA_CACHE_DIR': self.cache_dir.name})
+        self.env_patch.start()
+
+    def tearDown(self) -> None:
+        self.env_patch.stop()
+        self.cache_dir.cleanup()
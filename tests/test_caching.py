@@ -0,0 +1,181 @@
+import importlib
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from textwrap import dedent
+from unittest import TestCase, mock
+
+from tests import CacheDirMixin
+
+
+class TestManifest(CacheDirMixin, TestCase):
+    module_source = dedent('''
+        from clima import c, Schema
+
+
+        class C(Schema):
+            a: int = 1  # {description}
+            b: str = 'x'  # str description
+
+
+        @c
+        class Cli:
+            def x(self):
+                """x docstring"""
+    ''')
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.module_dir = tempfile.TemporaryDirectory()
+        sys.path.insert(0, self.module_dir.name)
+
+    def tearDown(self) -> None:
+        sys.path.remove(self.module_dir.name)
+        sys.modules.pop('manifest_module', None)
+        self.module_dir.cleanup()
+        super().tearDown()
+
+    def load_module(self, description):
+        from clima import c
+        path = Path(self.module_dir.name) / 'manifest_module.py'
+        path.write_text(self.module_source.format(description=description))
+        # Bump the mtime explicitly, as the test may run within the filesystem's timestamp granularity
+        st = path.stat()
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+        sys.modules.pop('manifest_module', None)
+        with mock.patch('clima.core.prepare'):
+            module = importlib.import_module('manifest_module')
+        return module, c
+
+    def test_warm_manifest_skips_source_parsing(self):
+        from clima import core, docstring, manifest
+        module, c = self.load_module('int description')
+        cli, schema = core.DECORATORS_STATE['generated'], core.DECORATORS_STATE['schema']
+
+        cold = manifest.get(cli, schema)
+        assert cold['help']['a']['description'] == 'int description'
+        assert cold['fields'][:2] == ['a', 'b']
+        assert cold['commands'] == ['x']
+
+        docstring.HELP_TABLES.clear()
+        with mock.patch.object(docstring, 'parse_schema_source', side_effect=AssertionError('source parsed')):
+            warm = manifest.get(cli, schema)
+
+        assert warm == cold
+
+    def test_changed_source_invalidates_manifest(self):
+        from clima import core, manifest
+        self.load_module('before')
+        manifest.get(core.DECORATORS_STATE['generated'], core.DECORATORS_STATE['schema'])
+
+        self.load_module('after')
+        changed = manifest.get(core.DECORATORS_STATE['generated'], core.DECORATORS_STATE['schema'])
+
+        assert changed['help']['a']['description'] == 'after'
+
+
+class TestHelpCache(CacheDirMixin, TestCase):
+    script_source = dedent('''
+        import atexit
+        import sys
+        from pathlib import Path
+        from clima import c, Schema
+
+        # Marks whether the help was rendered by fire
+        atexit.register(lambda: Path(__file__).with_suffix('.ran').write_text(str('clima.fire' in sys.modules)))
+
+
+        class C(Schema):
+            a: int = 1  # {description}
+
+
+        @c
+        class Cli:
+            def x(self):
+                """x docstring"""
+    ''')
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.script_dir = tempfile.TemporaryDirectory()
+        self.script = Path(self.script_dir.name) / 'tool.py'
+        self.marker = self.script.with_suffix('.ran')
+
+    def rendered(self):
+        return self.marker.read_text() == 'True'
+
+    def tearDown(self) -> None:
+        self.script_dir.cleanup()
+        super().tearDown()
+
+    def write_script(self, description):
+        self.script.write_text(self.script_source.format(description=description))
+        st = self.script.stat()
+        os.utime(self.script, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+    def run_script(self, *args):
+        if self.marker.exists():
+            self.marker.unlink()
+        env = dict(os.environ, PYTHONPATH=str(Path(__file__).parent.parent))
+        proc = subprocess.run(
+            [sys.executable, str(self.script), *args],
+            env=env, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        return proc.returncode, proc.stderr
+
+    def test_requested_command(self):
+        from clima.helpcache import requested_command
+        assert requested_command(['tool', '-h']) == ''
+        assert requested_command(['tool', '--', '--help']) == ''
+        assert requested_command(['tool', 'x', '--help']) == 'x'
+        assert requested_command(['tool', 'x', '--', '-h']) == 'x'
+        assert requested_command(['tool', 'x']) is None
+        assert requested_command(['tool', 'x', '--a', '2', '-h']) is None
+
+    def test_help_served_from_cache(self):
+        self.write_script('the a')
+        live = self.run_script('x', '-h')
+        assert self.rendered()
+        assert 'the a' in live[1]
+
+        cached = self.run_script('x', '--help')
+        assert not self.rendered(), 'fire should not be loaded for a cached help'
+        assert cached == live
+
+        top_level = self.run_script('-h')
+        assert not self.rendered()
+        assert 'Usage:' in top_level[1]
+
+    def test_import_doesnt_serve(self):
+        import clima
+        from clima import helpcache
+        with mock.patch.object(helpcache, 'serve') as serve, mock.patch.object(sys, 'argv', ['tool', 'x', '-h']):
+            importlib.reload(clima)
+
+        assert serve.call_count == 0
+
+    def test_changed_source_renders_live(self):
+        self.write_script('before')
+        self.run_script('x', '-h')
+
+        self.write_script('after')
+        returncode, stderr = self.run_script('x', '-h')
+        assert self.rendered()
+        assert 'after' in stderr
+
+    def test_build_ahead_of_time(self):
+        self.write_script('prebuilt')
+        env = dict(os.environ, PYTHONPATH=str(Path(__file__).parent.parent))
+        subprocess.run(
+            [sys.executable, '-m', 'clima', 'help-cache', str(self.script)],
+            env=env, stdin=subprocess.DEVNULL, check=True,
+        )
+
+        returncode, stderr = self.run_script('x', '-h')
+        assert not self.rendered()
+        assert returncode == 0
+        assert 'prebuilt' in stderr
@@ -1,6 +1,7 @@
 import tempfile
 from textwrap import dedent
-from unittest import TestCase
+from types import SimpleNamespace
+from unittest import TestCase, mock
 from pathlib import Path
 import os
 import sys
@@ -10,7 +11,7 @@ import sys
 # subclass when validating (e.g. on windows Path('...') -> WindowsPath('...') )
 from pathlib import PureWindowsPath as WindowsPath
 
-from tests import SysArgvRestore
+from tests import CacheDirMixin, SysArgvRestore
 
 
 class TestConfigFromWorkingDir(TestCase, SysArgvRestore):
@@ -139,3 +140,217 @@ class TestBooleansInConfig(TestCase, SysArgvRestore):
     #     assert self.c.foo[0] == 2
     #     assert self.c.foo[0] == 3
     #     assert type(self.c.foo) == list
+
+
+class TestConfigCache(CacheDirMixin, TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.package = self.root / 'package'
+        self.package.mkdir()
+        (self.package / '__init__.py').write_text('')
+        self.write(self.package / 'foo.cfg', '[Clima]\nbar = 42')
+
+        self.schema = SimpleNamespace(cwd=self.package / 'sub')
+        self.schema.cwd.mkdir()
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+        super().tearDown()
+
+    def write(self, path, content):
+        path.write_text(content)
+        # Bump the mtimes explicitly, as the test may run within the filesystem's timestamp granularity
+        for p in [path, path.parent]:
+            st = p.stat()
+            os.utime(p, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+        # As if in a new invocation
+        from clima import dirscan
+        dirscan.clear()
+
+    def test_warm_discovery_and_parse(self):
+        from clima import configfile
+        cold = configfile.read_config(configfile.get_config_path(self.schema))
+        assert cold == {'bar': '42'}
+
+        with mock.patch.object(Path, 'glob', side_effect=AssertionError('globbed')), \
+                mock.patch('configparser.ConfigParser.read', side_effect=AssertionError('parsed')):
+            path = configfile.get_config_path(self.schema)
+            warm = configfile.read_config(path)
+
+        assert path == self.package / 'foo.cfg'
+        assert warm == cold
+
+    def test_changes_invalidate(self):
+        from clima import configfile
+        configfile.read_config(configfile.get_config_path(self.schema))
+
+        self.write(self.package / 'foo.cfg', '[Clima]\nbar = 43')
+        assert configfile.read_config(configfile.get_config_path(self.schema)) == {'bar': '43'}
+
+        self.write(self.schema.cwd / 'closer.cfg', '[Clima]\nbar = 44')
+        assert configfile.get_config_path(self.schema) == self.schema.cwd / 'closer.cfg'
+
+    def test_pinned_path(self):
+        from clima import configfile
+        pinned = self.root / 'pinned.conf'
+        self.write(pinned, '[Clima]\nbar = 1')
+
+        with mock.patch.dict(os.environ, {'CLIMA_CONFIG': str(pinned)}), \
+                mock.patch.object(Path, 'glob', side_effect=AssertionError('globbed')):
+            assert configfile.get_config_path(self.schema) == pinned
+
+
+class TestProfiles(CacheDirMixin, TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        from clima import dirscan
+        dirscan.clear()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cfg = Path(self.tmp.name) / 'foo.cfg'
+        self.cfg.write_text(dedent('''\
+            [DEFAULT]
+            timeout = 5
+
+            [Clima]
+            host = localhost
+            port = 8080
+            url = http://%(host)s:%(port)s
+
+            [Clima:prod]
+            host = example.org
+            timeout = 30
+            '''))
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+        super().tearDown()
+
+    def test_inherits(self):
+        from clima import configfile
+        assert configfile.read_config(self.cfg) == {
+            'timeout': '5', 'host': 'localhost', 'port': '8080', 'url': 'http://localhost:8080'}
+        assert configfile.read_config(self.cfg, 'prod') == {
+            'timeout': '30', 'host': 'example.org', 'port': '8080', 'url': 'http://localhost:8080'}
+
+    def test_default_interpolation(self):
+        from clima import configfile
+        self.cfg.write_text(dedent('''\
+            [DEFAULT]
+            base = /srv
+
+            [Clima]
+            region = %(base)s/eu
+
+            [Clima:us]
+            region = %(base)s/us
+            '''))
+        assert configfile.read_config(self.cfg) == {'region': '/srv/eu', 'base': '/srv'}
+        assert configfile.read_config(self.cfg, 'us') == {'region': '/srv/us', 'base': '/srv'}
+
+    def test_switching_doesnt_parse(self):
+        from clima import configfile
+        configfile.read_config(self.cfg)
+        with mock.patch('configparser.ConfigParser.read_string', side_effect=AssertionError('parsed')):
+            assert configfile.read_config(self.cfg, 'prod')['host'] == 'example.org'
+            # Unknown profiles fall back to [Clima]
+            assert configfile.read_config(self.cfg, 'staging')['host'] == 'localhost'
+
+    def test_selected(self):
+        from clima import configfile
+        assert configfile.get_profile() is None
+        with mock.patch.dict(os.environ, {'CLIMA_PROFILE': 'prod'}):
+            assert configfile.get_profile() == 'prod'
+            configfile.select_profile('dev')
+            try:
+                assert configfile.get_profile() == 'dev'
+            finally:
+                configfile.select_profile(None)
+
+    def test_pop_profile(self):
+        from clima.core import pop_profile
+        assert pop_profile(['t', 'x', '--', '--profile', 'prod']) == (['t', 'x'], 'prod')
+        assert pop_profile(['t', 'x', '--', '--trace', '--profile=prod']) == (['t', 'x', '--', '--trace'], 'prod')
+        assert pop_profile(['t', 'x', '--profile', 'prod']) == (['t', 'x', '--profile', 'prod'], None)
+        assert pop_profile(['t', 'x', '--', '--trace']) == (['t', 'x', '--', '--trace'], None)
+
+    def test_profile_field_is_not_the_flag(self):
+        from clima import c, configfile, Schema
+        saved = sys.argv
+
+        class C(Schema):
+            cwd: Path = Path(self.tmp.name)
+            profile: str = 'default'
+            host: str = ''
+
+        try:
+            sys.argv = ['test', 'x', '--', '--profile', 'prod']
+            with mock.patch('sys.stderr') as stderr:
+                @c
+                class Cli:
+                    def x(self):
+                        return c.host
+
+            assert c.profile == 'default'
+            assert c.host == 'example.org'
+            assert not any('no profile' in str(call) for call in stderr.mock_calls)
+        finally:
+            sys.argv = saved
+            configfile.select_profile(None)
+
+
+class TestDirectoryScan(TestCase):
+    """Each directory is listed once per invocation and the file based sources don't stat their candidates"""
+
+    def setUp(self) -> None:
+        from clima import dirscan
+        dirscan.clear()
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.package = Path(self.tmp.name) / 'package'
+        self.cwd = self.package / 'sub'
+        self.cwd.mkdir(parents=True)
+        (self.package / '__init__.py').write_text('')
+        (self.package / 'foo.cfg').write_text('[Clima]\nbar = 42')
+        (self.cwd / '.env').write_text('baz=43')
+        (self.cwd / 'pyproject.toml').write_text('[tool.poetry]\nversion = "1.2.3"')
+
+        self.schema = SimpleNamespace(cwd=self.cwd, bar=0, baz=0, _fields=['bar', 'baz'])
+        self.old_cwd = os.getcwd()
+        os.chdir(self.cwd)
+
+    def tearDown(self) -> None:
+        os.chdir(self.old_cwd)
+        self.tmp.cleanup()
+
+    def test_syscalls(self):
+        from clima import configfile, env, schema
+
+        scandir, stat = os.scandir, os.stat
+        scanned, stated = [], []
+
+        def counting_scandir(path='.'):
+            scanned.append(os.path.abspath(path))
+            return scandir(path)
+
+        def counting_stat(path, *args, **kwargs):
+            stated.append(os.fspath(path))
+            return stat(path, *args, **kwargs)
+
+        with mock.patch.dict(os.environ, {'CLIMA_NO_CACHE': '1'}), \
+                mock.patch('os.scandir', counting_scandir), mock.patch('os.stat', counting_stat):
+            for _ in range(2):
+                cfg = configfile.read_config(configfile.get_config_path(self.schema))
+                dot_env = env.get_env(self.schema)
+                version = schema.parse_version_from_pyproject_toml()
+
+        assert cfg == {'bar': '42'}
+        assert dot_env == {'baz': '43'}
+        assert version == '1.2.3'
+
+        # The package's parent is looked into for an __init__.py
+        assert sorted(scanned) == sorted({self.tmp.name, str(self.package), str(self.cwd)})
+        candidates = ('.cfg', '.conf', '.env', 'pyproject.toml', '__init__.py')
+        assert [p for p in stated if p.endswith(candidates)] == []
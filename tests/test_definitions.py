@@ -1,3 +1,4 @@
+import os
 import sys
 from functools import partial
 from functools import wraps
@@ -7,7 +8,7 @@ from pathlib import PurePosixPath as PosixPath
 # Can't use just Path, because that will get rendered to a platform specific
 # subclass when validating (e.g. on windows Path('...') -> WindowsPath('...') )
 from pathlib import PureWindowsPath as WindowsPath
-from unittest import TestCase
+from unittest import TestCase, mock
 
 from tests import SysArgvRestore
 
@@ -578,3 +579,98 @@ class TestIterables(TestCase, SysArgvRestore):
         assert c.d == list([self._str]), 'Should wrap in iterable when configured in schema'
         assert c.e == {self._int}, 'Should wrap in iterable when configured in schema'
         assert c.f == {self._str}, 'Should wrap in iterable when configured in schema'
+
+
+class TestFieldRegistry(TestCase, SysArgvRestore):
+    def test_registry(self):
+        from clima import c, Schema, schema
+
+        class Base(Schema):
+            b: int = 1
+            a = 'a'
+
+        class C(Base):
+            z: Path = '/tmp'
+            b: str = 2
+
+            def method(self):
+                pass
+
+        registry = schema.fields(C)
+        assert list(registry) == ['b', 'a', 'z'], 'in the order of definition, base classes first'
+        assert registry['b'] == ('b', str, '2', registry['b'].caster, 0)
+        assert registry['z'].default == Path('/tmp')
+        assert registry['a'].annotation is None and registry['a'].caster(5) == 5
+        assert C()._fields == ['b', 'a', 'z', 'version']
+        assert C()._asdict() == {'b': '2', 'a': 'a', 'z': Path('/tmp')}
+
+        with self.assertRaises(TypeError):
+            registry['new'] = None
+
+    def test_positional_args_in_definition_order(self):
+        from clima import c, Schema
+        sys.argv = ['test', 'x', '1', 'two']
+
+        class C(Schema):
+            second: int = 0
+            first: str = ''
+
+        @c
+        class Cli:
+            def x(self):
+                pass
+
+        assert (c.second, c.first) == (1, 'two')
+
+
+class Counted(str):
+    """Counts the casts"""
+    casts = 0
+
+    def __new__(cls, value):
+        Counted.casts += 1
+        return super().__new__(cls, value)
+
+
+class TestCasters(TestCase, SysArgvRestore):
+    def test_compiled_casters(self):
+        from clima.validation import compile_caster
+
+        as_list = compile_caster(list)
+        assert as_list('VST') == ['VST']
+        assert as_list((1, 2)) == [1, 2]
+        value = [1]
+        assert as_list(value) is value
+
+        as_bool = compile_caster(bool)
+        assert [as_bool(v) for v in ('False', 'no', '0', '', 'TRUE', 'on', 1)] == [False] * 4 + [True] * 3
+
+        as_path = compile_caster(PosixPath)
+        assert as_path('/tmp') == PosixPath('/tmp')
+
+        assert compile_caster(None)('1') == '1'
+        assert compile_caster(int)('1') == 1
+
+    def test_cast_once(self):
+        from clima import c, Schema
+
+        Counted.casts = 0
+
+        class C(Schema):
+            a: Counted = 'default'
+            b: Counted = 'default'
+            flag: bool = True
+
+        assert Counted.casts == 2, 'the defaults should be cast once'
+
+        sys.argv = ['test', 'x', '--a', 'arg']
+        with mock.patch.dict(os.environ, {'b': 'env', 'flag': 'false'}):
+            @c
+            class Cli:
+                def x(self):
+                    pass
+
+            assert (c.a, c.a, c.b, c.b) == ('arg', 'arg', 'env', 'env')
+            assert c.flag is False
+
+        assert Counted.casts == 4, 'the values given should be cast once'
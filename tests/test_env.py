@@ -0,0 +1,162 @@
+import io
+import os
+import tempfile
+from pathlib import Path
+from textwrap import dedent
+from types import SimpleNamespace
+from unittest import TestCase, mock, skipIf
+
+from tests import CacheDirMixin
+
+try:
+    import dotenv
+except ImportError:
+    dotenv = None
+
+SAMPLE = dedent('''\
+    # shared with other tooling
+    OTHER=1
+    export HOST = example.org   # a comment
+    'quoted key'=x
+    url=https://${HOST}:${PORT:-8080}/${MISSING}
+    single='it\\'s ${HOST} \\n'
+    double="tab\\there
+    second line \\"quoted\\""
+    broken="unterminated
+    empty=
+    novalue
+    garbage=1 "x" trailing
+    bad key=1
+    unquoted=a b   c # comment
+    hash=a#b
+    spaced = "v" # c
+    nested=${url}/x
+    from_env=${CLIMA_TEST_ENV}
+    ''')
+
+FIELDS = ['url', 'single', 'double', 'broken', 'empty', 'novalue', 'garbage', 'bad',
+          'unquoted', 'hash', 'spaced', 'nested', 'from_env']
+
+
+@skipIf(dotenv is None, 'python-dotenv not installed')
+class TestEnvReader(TestCase):
+    def setUp(self) -> None:
+        self.env_patch = mock.patch.dict(os.environ, {'CLIMA_TEST_ENV': 'from environment'})
+        self.env_patch.start()
+
+    def tearDown(self) -> None:
+        self.env_patch.stop()
+
+    def test_compatible_with_dotenv(self):
+        from clima import env
+        expected = {k: v for k, v in dotenv.dotenv_values(stream=io.StringIO(SAMPLE)).items() if k in FIELDS}
+
+        values, environ = env.read_env(SAMPLE, FIELDS)
+
+        assert values == expected
+        assert values['url'] == 'https://example.org:8080/'
+        assert environ == {'HOST': None, 'PORT': None, 'MISSING': None, 'url': None,
+                           'CLIMA_TEST_ENV': 'from environment'}
+
+    def test_last_definition_wins(self):
+        from clima import env
+        text = 'a=1\na=2\nb=3\n'
+        assert env.read_env(text, ['a', 'b'])[0] == {'a': '2', 'b': '3'}
+        assert env.read_env(text, ['a', 'b'])[0] == dotenv.dotenv_values(stream=io.StringIO(text))
+
+
+    def test_only_fields_decoded(self):
+        from clima import env
+        text = 'OTHER="not decoded"\nPORT=80\nurl=http://h:${PORT}\nOTHER=again\n'
+        with mock.patch.object(dotenv, 'dotenv_values', wraps=dotenv.dotenv_values) as dotenv_values:
+            values, _ = env.read_env(text, ['url'])
+
+        assert values == {'url': 'http://h:80'}
+        assert dotenv_values.call_args.kwargs['stream'].getvalue() == 'PORT=80\nurl=http://h:${PORT}\n'
+
+
+@skipIf(dotenv is None, 'python-dotenv not installed')
+class TestEnvCache(CacheDirMixin, TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        from clima import dirscan
+        dirscan.clear()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.env_file = Path(self.tmp.name) / '.env'
+        self.env_file.write_text('a=1\nb=${CLIMA_TEST_ENV}\n')
+        self.schema = SimpleNamespace(cwd=Path(self.tmp.name), _fields=['a', 'b', 'version'])
+        self.environ_patch = mock.patch.dict(os.environ, {'CLIMA_TEST_ENV': 'x'})
+        self.environ_patch.start()
+
+    def tearDown(self) -> None:
+        self.environ_patch.stop()
+        self.tmp.cleanup()
+        super().tearDown()
+
+    def get_env(self):
+        from clima import dirscan, env
+        # As if in a new invocation
+        dirscan.clear()
+        return env.get_env(self.schema)
+
+    def test_cached_until_changed(self):
+        from clima import env
+        assert self.get_env() == {'a': '1', 'b': 'x'}
+
+        with mock.patch.object(env, 'scan', side_effect=AssertionError('scanned again')):
+            assert self.get_env() == {'a': '1', 'b': 'x'}
+
+        os.environ['CLIMA_TEST_ENV'] = 'y'
+        assert self.get_env() == {'a': '1', 'b': 'y'}
+
+        self.env_file.write_text('a=22\nb=2\n')
+        assert self.get_env() == {'a': '22', 'b': '2'}
+
+    def test_values_not_cached(self):
+        self.env_file.write_text('a=first secret\na="second secret"\nb=1\n')
+        assert self.get_env() == {'a': 'second secret', 'b': '1'}
+
+        for cached in Path(self.cache_dir.name).rglob('*'):
+            if cached.is_file():
+                assert 'secret' not in cached.read_text()
+
+    def test_version_not_looked_up(self):
+        from clima import env
+        assert env.env_file_fields(self.schema) == ('a', 'b')
+        self.env_file.write_text('version=1.0\na=1\n')
+        assert self.get_env() == {'a': '1'}
+
+
+class TestEnvironment(TestCase):
+    def setUp(self) -> None:
+        self.env_patch = mock.patch.dict(os.environ, {
+            'host': 'plain', 'MYTOOL_HOST': 'prefixed', 'MYTOOL_port': '8080', 'MYTOOL_PORT': '80'})
+        self.env_patch.start()
+
+    def tearDown(self) -> None:
+        self.env_patch.stop()
+
+    def test_fields_by_name(self):
+        from clima import Schema, env
+
+        class C(Schema):
+            host: str = 'default'
+            port: int = 0
+
+        assert env.get_environment(C()) == {'host': 'plain'}
+
+    def test_prefix(self):
+        from clima import Schema, env
+
+        class C(Schema, env_prefix='MYTOOL_'):
+            host: str = 'default'
+            port: int = 0
+            user: str = 'default'
+
+        # The exact name precedes the upper cased one
+        assert env.get_environment(C()) == {'host': 'prefixed', 'port': '8080'}
+
+        class D(C):
+            pass
+
+        assert env.get_environment(D()) == {'host': 'prefixed', 'port': '8080'}
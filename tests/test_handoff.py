@@ -0,0 +1,143 @@
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from textwrap import dedent
+from unittest import TestCase, mock
+
+from tests import SysArgvRestore
+
+CHILD = dedent('''
+    import json
+    from clima import c, Schema
+
+
+    class C(Schema):
+        host: str = 'default'
+        port: int = 0
+        token: str = 'default'
+
+
+    @c
+    class Cli:
+        def show(self):
+            print(json.dumps({'host': c.host, 'port': c.port, 'token': c.token}))
+    ''')
+
+
+class TestHandOff(SysArgvRestore, TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        from clima import c, Schema, password_store
+        self.c = c
+        self.tmp = tempfile.TemporaryDirectory()
+        self.child = Path(self.tmp.name) / 'child.py'
+        self.child.write_text(CHILD)
+
+        class C(Schema):
+            host: str = 'default'
+            port: int = 0
+            token: str = 'default'
+
+        self.schema_cls = C
+        mock.patch.dict(os.environ, {'host': 'parent host', 'port': '8080'}).start()
+        self.get_secret = mock.patch.object(
+            password_store, 'get_secret', side_effect=lambda key: 'secret' if key == 'token' else None).start()
+        mock.patch.object(password_store, 'prefetch_enabled', return_value=False).start()
+
+        sys.argv = ['test', 'x']
+
+        @c
+        class Cli:
+            def x(self):
+                pass
+
+    def tearDown(self) -> None:
+        from clima import handoff
+        handoff.clear()
+        mock.patch.stopall()
+        self.tmp.cleanup()
+        super().tearDown()
+
+    def run_child(self, *args, secrets=False):
+        from clima import hand_off
+        with hand_off(secrets=secrets) as kwargs:
+            assert 'secret' not in kwargs['env']['CLIMA_HANDOFF']
+            # The handed values take the place of the child's environment
+            kwargs['env'].update(host='child host', PYTHONPATH=str(Path(__file__).parent.parent))
+            proc = subprocess.run(
+                [sys.executable, str(self.child), 'show', *args], **kwargs,
+                stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, universal_newlines=True, check=True,
+            )
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+
+    def test_values_handed_off(self):
+        assert self.run_child() == {'host': 'parent host', 'port': 8080, 'token': 'default'}
+        assert self.get_secret.call_count == 0
+
+    def test_secrets_through_pipe(self):
+        assert self.run_child(secrets=True)['token'] == 'secret'
+
+    def test_child_args_precede(self):
+        assert self.run_child('--port', '9')['port'] == 9
+
+    def test_post_init_overrides_handed_off(self):
+        from clima import c
+
+        @c
+        class Cli:
+            def post_init(self):
+                self.port = 9000
+
+            def x(self):
+                pass
+
+        assert self.run_child()['port'] == 9000
+
+    def test_secret_override_not_in_environment(self):
+        from clima import c, hand_off
+
+        @c
+        class Cli:
+            def post_init(self):
+                self.token = self.token.upper()
+
+            def x(self):
+                pass
+
+        with hand_off() as kwargs:
+            assert 'SECRET' not in kwargs['env']['CLIMA_HANDOFF']
+        assert self.run_child(secrets=True)['token'] == 'SECRET'
+
+    def received(self, fields):
+        from clima import handoff, schema
+        blob = json.dumps({'format': handoff.FORMAT, 'fields': fields, 'values': {'port': 1}})
+        with mock.patch.dict(os.environ, {handoff.ENV_BLOB: blob}), mock.patch('sys.stderr', io.StringIO()) as stderr:
+            handoff.clear()
+            received = handoff.received(schema.fields(self.schema_cls))
+            assert handoff.ENV_BLOB not in os.environ
+        return received, stderr.getvalue()
+
+    def test_matching_fields(self):
+        from clima import handoff, schema
+        received, stderr = self.received(handoff.field_types(schema.fields(self.schema_cls)))
+        assert received == ({'port': 1}, {})
+        assert stderr == ''
+
+    def test_mismatching_fields_ignored(self):
+        received, stderr = self.received({'other': repr(int)})
+        assert received is None
+        assert 'warning' in stderr
+
+    def test_mismatching_annotations_ignored(self):
+        from clima import handoff, schema
+        received, stderr = self.received({'host': repr(str), 'port': repr(str), 'token': repr(str)})
+        assert received is None
+        assert 'annotations' in stderr
+
+        with mock.patch('sys.stderr', io.StringIO()) as stderr:
+            assert handoff.received(schema.fields(self.schema_cls)) is None
+        assert stderr.getvalue() == '', 'a rejected handoff should be warned about once'
@@ -0,0 +1,132 @@
+import os
+import sys
+from unittest import TestCase, mock
+
+from tests import SysArgvRestore
+
+
+class TestLazyLayers(TestCase, SysArgvRestore):
+    def setUp(self) -> None:
+        super().setUp()
+        from clima import c, Schema, password_store
+        self.c = c
+
+        class C(Schema):
+            given: int = 0
+            from_env: str = 'default'
+            token: str = 'default'
+            plain: str = 'default'
+            required: str = None
+
+        self.env_patch = mock.patch.dict(os.environ, {'from_env': 'env', 'token': 'env token'})
+        self.env_patch.start()
+        # Secrets exist for every field, so any decryption is visible in the calls
+        self.get_secret = mock.patch.object(
+            password_store, 'get_secret', side_effect=lambda key: f'secret {key}').start()
+
+    def tearDown(self) -> None:
+        mock.patch.stopall()
+        super().tearDown()
+
+    def define_cli(self):
+        @self.c
+        class Cli:
+            def x(self):
+                pass
+
+    def test_cli_arg_skips_lower_layers(self):
+        from clima import env
+        sys.argv = ['test', 'x', '--given', '5']
+        with mock.patch.object(env, 'get_environment', wraps=env.get_environment) as get_environment:
+            self.define_cli()
+            assert self.c.given == 5
+
+        assert get_environment.call_count == 0, 'the environment should not be read for a field given as an arg'
+        assert self.get_secret.call_count == 0
+
+    def test_secrets_decrypted_on_access(self):
+        sys.argv = ['test', 'x']
+        self.define_cli()
+        assert self.get_secret.call_count == 0, 'secrets should not be decrypted before accessing them'
+
+        # Precedence: environment > password store > defaults
+        assert self.c.token == 'env token'
+        assert self.c.plain == 'secret plain'
+        assert self.c.plain == 'secret plain'
+        self.get_secret.assert_called_once_with('plain')
+
+    def test_missing_value_raises_on_access(self):
+        from clima.core import RequiredParameterException
+        sys.argv = ['test', 'x']
+        self.get_secret.side_effect = lambda key: None
+        self.define_cli()
+
+        assert self.c.plain == 'default'
+        with self.assertRaises(RequiredParameterException):
+            self.c.required
+
+
+class TestConcurrentLayers(TestCase, SysArgvRestore):
+    def setUp(self) -> None:
+        super().setUp()
+        from clima import c, Schema, password_store
+        self.c = c
+
+        class C(Schema):
+            from_env: str = 'default'
+            from_dotenv: str = 'default'
+            token: str = 'default'
+            plain: int = 0
+
+        self.env_patch = mock.patch.dict(os.environ, {'from_env': 'env', 'token': 'env token'})
+        self.env_patch.start()
+        mock.patch.object(password_store, 'index', return_value={}).start()
+        mock.patch.object(password_store, 'prefetch_enabled', return_value=False).start()
+        mock.patch.object(
+            password_store, 'get_secret', side_effect=lambda key: '5' if key == 'plain' else None).start()
+
+    def tearDown(self) -> None:
+        mock.patch.stopall()
+        super().tearDown()
+
+    def resolve(self, concurrent, dotenv=None):
+        from clima import env, layers
+        sys.argv = ['test', 'x']
+        os.environ.pop('CLIMA_CONCURRENT_LAYERS', None)
+        if concurrent:
+            os.environ['CLIMA_CONCURRENT_LAYERS'] = '1'
+
+        get_env = mock.Mock(side_effect=dotenv or (lambda _schema: {'from_dotenv': 'dotenv', 'token': 'x'}))
+        with mock.patch.object(env, 'get_env', get_env):
+            @self.c
+            class Cli:
+                def x(self):
+                    pass
+
+            configured = self.c._get_configured()
+            assert isinstance(configured, layers.Resolved)
+            dotenv_layer = configured.layers.maps[2]
+            if concurrent:
+                assert dotenv_layer._future is not None, 'the layers should be loading'
+
+            results = {}
+            for field in ['from_env', 'from_dotenv', 'token', 'plain']:
+                try:
+                    results[field] = getattr(self.c, field)
+                except Exception as ex:
+                    results[field] = repr(ex)
+            return results
+
+    def test_same_as_sequential(self):
+        sequential = self.resolve(concurrent=False)
+        assert sequential == {'from_env': 'env', 'from_dotenv': 'dotenv', 'token': 'env token', 'plain': 5}
+        assert self.resolve(concurrent=True) == sequential
+
+    def test_failure_isolated(self):
+        def broken(_schema):
+            raise RuntimeError('unreadable .env')
+
+        sequential = self.resolve(concurrent=False, dotenv=broken)
+        assert sequential['from_env'] == 'env'
+        assert sequential['from_dotenv'] == repr(RuntimeError('unreadable .env'))
+        assert self.resolve(concurrent=True, dotenv=broken) == sequential
@@ -0,0 +1,125 @@
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+from textwrap import dedent
+from typing import Tuple
+from unittest import TestCase, mock
+
+from tests import CacheDirMixin, SysArgvRestore
+
+
+class TestLockfile(CacheDirMixin, SysArgvRestore, TestCase):
+    def setUp(self) -> None:
+        CacheDirMixin.setUp(self)
+        SysArgvRestore.setUp(self)
+        from clima import c, dirscan, Schema, password_store
+        dirscan.clear()
+        self.c = c
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.write('tool.cfg', '[Clima]\nport = 8080\ntags = a\nmode = dev\n')
+        self.write('.env', 'mode=prod\n')
+        self.lockfile = self.dir / 'clima.lock'
+        mock.patch.dict(os.environ, {'CLIMA_LOCKFILE': str(self.lockfile)}).start()
+        self.get_secret = mock.patch.object(
+            password_store, 'get_secret', side_effect=lambda key: 'secret' if key == 'token' else None).start()
+        mock.patch.object(password_store, 'prefetch_enabled', return_value=False).start()
+
+        directory = self.dir
+
+        class C(Schema):
+            cwd: Path = directory
+            port: int = 0
+            tags: Tuple[str, ...] = ()
+            mode: str = 'dev'
+            token: str = 'default'
+
+        self.schema = C()
+
+    def tearDown(self) -> None:
+        mock.patch.stopall()
+        self.tmp.cleanup()
+        SysArgvRestore.tearDown(self)
+        CacheDirMixin.tearDown(self)
+
+    def write(self, name, content):
+        from clima import dirscan
+        (self.dir / name).write_text(dedent(content))
+        # A new invocation
+        dirscan.clear()
+
+    def locked(self):
+        from clima import dirscan, lockfile, schema
+        dirscan.clear()
+        return lockfile.get_locked(self.lockfile, self.schema, schema.fields(self.schema))
+
+    def assert_not_resolved(self):
+        from clima import lockfile
+        return mock.patch.object(lockfile, 'resolve', side_effect=AssertionError('resolved again'))
+
+    def test_locked_values(self):
+        expected = {'port': 8080, 'tags': ('a',), 'mode': 'prod'}
+        assert self.locked() == expected
+
+        content = json.loads(self.lockfile.read_text())
+        assert content['values'] == {'port': 8080, 'tags': ['a'], 'mode': 'prod'}
+        assert 'token' not in content['values']
+
+        with self.assert_not_resolved():
+            assert self.locked() == expected
+
+    def test_rejected_when_sources_change(self):
+        self.locked()
+        self.write('tool.cfg', '[Clima]\nport = 9090\n')
+        assert self.locked()['port'] == 9090
+
+        self.write('.env', 'mode=staging\n')
+        assert self.locked()['mode'] == 'staging'
+
+        with mock.patch.dict(os.environ, {'port': '1'}):
+            assert self.locked()['port'] == 1
+        assert self.locked()['port'] == 9090
+
+        # Unrelated files don't affect the discovery
+        self.write('notes.txt', 'x')
+        with self.assert_not_resolved():
+            self.locked()
+
+        # Precedes tool.cfg
+        self.write('a.cfg', '[Clima]\nport = 1234\n')
+        assert self.locked()['port'] == 1234
+
+    def test_chain(self):
+        self.locked()
+        sys.argv = ['test', 'x', '--port', '1']
+        with self.assert_not_resolved():
+            @self.c
+            class Cli:
+                def x(self):
+                    pass
+
+            # Precedence: command line > lockfile > password store > defaults
+            assert self.c.port == 1
+            assert self.c.mode == 'prod'
+            assert self.c.tags == ('a',)
+            assert self.c.token == 'secret'
+
+    def test_secrets_not_locked(self):
+        from clima import password_store
+        self.write('.env', 'mode=prod\ntoken=from dotenv\n')
+        with mock.patch.object(password_store, 'index', return_value={'token': ('token.gpg', None)}):
+            self.locked()
+            assert 'from dotenv' not in self.lockfile.read_text()
+
+            sys.argv = ['test', 'x']
+            with self.assert_not_resolved():
+                @self.c
+                class Cli:
+                    def x(self):
+                        pass
+
+                # The .env still precedes the password store
+                assert self.c.token == 'from dotenv'
+                assert self.c.mode == 'prod'
@@ -1,9 +1,14 @@
-from unittest import TestCase
+from contextlib import redirect_stderr
+from pathlib import Path
+from unittest import TestCase, mock
+import io
+import json
+import subprocess
 import sys
 
 from clima import c, Schema
 
-from tests import SysArgvRestore
+from tests import CacheDirMixin, SysArgvRestore
 
 
 class TestSimple(TestCase, SysArgvRestore):
@@ -17,3 +22,232 @@ class TestSimple(TestCase, SysArgvRestore):
         class D:
             def x(self):
                 pass
+
+
+class TestImportTime(TestCase):
+    # Generous enough for slow CI runners, tight enough to catch eager imports creeping back
+    budget = 0.3
+
+    script = (
+        'import sys, time\n'
+        't = time.perf_counter()\n'
+        'import clima\n'
+        'print(time.perf_counter() - t)\n'
+        'print(",".join(sorted(m for m in {modules} if m in sys.modules)))\n'
+    )
+
+    def test_import_budget(self):
+        lazy_modules = ('clima.fire', 'clima.password_store', 'clima.env', 'clima.cache', 'tabulate', 'dotenv')
+        root = Path(__file__).parent.parent
+        out = subprocess.check_output(
+            [sys.executable, '-c', self.script.format(modules=lazy_modules)],
+            cwd=root,
+            universal_newlines=True,
+        )
+        elapsed, loaded = out.splitlines()
+
+        assert loaded == '', f'import clima should not load optional subsystems: {loaded}'
+        assert float(elapsed) < self.budget, f'import clima took {float(elapsed):.3f}s (budget {self.budget}s)'
+
+
+class TestTimings(TestCase, SysArgvRestore):
+    def test_timings_json(self):
+        from clima import timings
+        timings.clear()
+        sys.argv = ['test', 'x', '--', '--timings', 'json']
+
+        class C(Schema):
+            a: int = 1
+
+        stderr = io.StringIO()
+        with redirect_stderr(stderr):
+            @c
+            class D:
+                def x(self):
+                    # The configuration layers are loaded on access
+                    return c.a
+
+        phases = [d['phase'] for d in json.loads(stderr.getvalue())]
+        for expected in ['MetaSchema.__new__ (C)', 'prepare_argv', 'config: environment', 'Fire']:
+            assert expected in phases, f'{expected} missing from the timings report: {phases}'
+
+
+class TestLazyVersion(TestCase, SysArgvRestore):
+    def setUp(self) -> None:
+        super().setUp()
+        from clima import schema
+        schema.VERSIONS.clear()
+
+    def test_version_resolved_on_access(self):
+        from clima import schema
+        sys.argv = ['test', 'x']
+
+        with mock.patch.object(schema, 'deduce_importer_version', return_value=('1.2.3', None)) as deduce:
+            class C(Schema):
+                a: int = 1
+
+            @c
+            class D:
+                def x(self):
+                    pass
+
+            assert deduce.call_count == 0, 'version should not be resolved before it is needed'
+            assert c.version == '1.2.3'
+            assert c.version == '1.2.3'
+            assert deduce.call_count == 1, 'version should be memoized'
+
+    def test_importer_package(self):
+        from clima import schema
+        assert schema.importer_package('clima.fire.core') == 'clima'
+        assert schema.importer_package('tests.test_misc_features') == 'tests'
+
+
+class TestVersionCache(CacheDirMixin, TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        from clima import schema
+        schema.VERSIONS.clear()
+
+    def tearDown(self) -> None:
+        from clima import schema
+        schema.VERSIONS.clear()
+        super().tearDown()
+
+    def test_fallback_not_cached(self):
+        from clima import schema
+        with mock.patch.object(schema, 'deduce_importer_version', return_value=(None, None)), \
+                mock.patch.object(schema, 'parse_version_from_pyproject_toml', return_value=None):
+            assert schema.get_pkg_version(__name__) == '0.0.1'
+
+        schema.VERSIONS.clear()
+        with mock.patch.object(schema, 'deduce_importer_version', return_value=(None, None)), \
+                mock.patch.object(schema, 'parse_version_from_pyproject_toml', return_value='1.2.3'):
+            assert schema.get_pkg_version(__name__) == '1.2.3'
+
+    def test_distribution_metadata(self):
+        from clima import schema
+        import pytest
+
+        version, metadata_path = schema.deduce_importer_version('pytest')
+        assert version == pytest.__version__
+        assert metadata_path.name in ('METADATA', 'PKG-INFO')
+        assert Path(metadata_path).is_file()
+
+
+class TestDocstringHelp(TestCase, SysArgvRestore):
+    def setUp(self) -> None:
+        super().setUp()
+
+        class C(Schema):
+            url: str = 'http://example.com/#anchor'  # the url
+            retries: int = 3
+            # a comment between fields
+            name: str = "#hash"  # a name # with a hash
+
+            def post_init(self, *args):
+                pass
+
+        self.schema_cls = C
+
+    def test_hash_in_string_default(self):
+        from clima import docstring
+        table = docstring.help_table(self.schema_cls)
+
+        assert list(table) == ['url', 'retries', 'name']
+        assert table['url'] == {'type': 'str', 'default': "'http://example.com/#anchor'", 'description': 'the url'}
+        assert table['retries']['description'] == ''
+        assert table['name']['default'] == '"#hash"'
+        assert table['name']['description'] == 'a name # with a hash'
+
+    def test_parsed_once_per_class(self):
+        from clima import docstring
+        docstring.HELP_TABLES.clear()
+        with mock.patch.object(docstring, 'parse_schema_source', wraps=docstring.parse_schema_source) as parse:
+            for _ in range(3):
+                docstring.prepare_docstring_help(self.schema_cls())
+
+        assert parse.call_count == 1
+
+    def test_prepare_twice_keeps_docstring(self):
+        from clima import core
+        sys.argv = ['test', 'x']
+
+        @c
+        class D:
+            def x(self):
+                """x docstring"""
+
+        assert D.x.__doc__ == 'x docstring', 'docstrings should be augmented only for the help'
+
+        from clima.fire import helputils
+        for _ in range(2):
+            helputils.HelpString(D.x)
+
+        assert D.x.__doc__.count('Args:') == 1
+
+    def test_help_skips_configuration(self):
+        from clima import core
+        sys.argv = ['test', 'x', '-h']
+
+        class C(Schema):
+            a: int = 1  # the a
+
+        stdout = io.StringIO()
+        with mock.patch.object(core.Configurable, '_chain_configurations') as chain, \
+                redirect_stderr(stdout), self.assertRaises(SystemExit):
+            @c
+            class D:
+                def x(self):
+                    """x docstring"""
+
+        assert chain.call_count == 0
+        assert '--a' in stdout.getvalue()
+        assert 'the a' in stdout.getvalue()
+
+    def test_help_flag_as_value(self):
+        sys.argv = ['test', 'x', '--a', '-h', '--b', '2']
+
+        class C(Schema):
+            a: str = ''
+            b: int = 1
+
+        stdout = io.StringIO()
+        with mock.patch('sys.stdout', stdout):
+            @c
+            class D:
+                def x(self):
+                    print(c.a, c.b)
+
+        assert stdout.getvalue().strip() == '-h 2'
+
+    def test_completion_lists_fields(self):
+        sys.argv = ['test', '--', '--completion']
+
+        class C(Schema):
+            a: int = 1  # the a
+
+        stdout = io.StringIO()
+        with mock.patch('sys.stdout', stdout):
+            @c
+            class D:
+                def x(self):
+                    pass
+
+        assert '--a' in stdout.getvalue()
+
+    def test_version_skips_fire(self):
+        from clima import core, manifest
+        sys.argv = ['test', 'version']
+
+        class C(Schema):
+            a: int = 1
+
+        stdout = io.StringIO()
+        with mock.patch.object(manifest, 'get') as get, mock.patch('sys.stdout', stdout):
+            @c
+            class D:
+                def x(self):
+                    pass
+
+        assert get.call_count == 0
+        assert stdout.getvalue().strip() == str(C.version)
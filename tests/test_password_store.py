@@ -0,0 +1,353 @@
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from textwrap import dedent
+from unittest import TestCase, mock
+
+from tests import CacheDirMixin, SysArgvRestore
+
+
+class TestPasswordStoreIndex(CacheDirMixin, TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        from clima import password_store
+        self.password_store = password_store
+
+        self.store_dir = tempfile.TemporaryDirectory()
+        self.store = Path(self.store_dir.name)
+        self.write('.gpg-id', 'root-id')
+        self.write('top.gpg')
+        self.write('work/.gpg-id', 'work-id')
+        self.write('work/deep/token.gpg')
+        self.write('personal/token.gpg')
+        self.write('personal/mail.gpg')
+        self.write('.git/hidden.gpg')
+
+        self.path_patch = mock.patch.object(password_store, 'PW_STORE_PATH', str(self.store))
+        self.path_patch.start()
+        password_store.INDEXES.clear()
+
+    def tearDown(self) -> None:
+        self.path_patch.stop()
+        self.password_store.INDEXES.clear()
+        self.store_dir.cleanup()
+        super().tearDown()
+
+    def write(self, rel_path, content=''):
+        path = self.store / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+    def test_index_resolves_nearest_gpg_id(self):
+        index = self.password_store.index()
+
+        assert index['top'] == (str(self.store / 'top.gpg'), 'root-id')
+        assert index['mail'] == (str(self.store / 'personal' / 'mail.gpg'), 'root-id')
+        assert index['token'] == (str(self.store / 'personal' / 'token.gpg'), 'root-id'), \
+            'the first one in name order should win'
+        assert 'hidden' not in index
+
+    def test_decrypt_uses_index(self):
+        with mock.patch.object(self.password_store, 'decrypt_file_with_id', return_value='s3cret') as decrypt:
+            assert self.password_store.decrypt('top') == 's3cret'
+            assert self.password_store.decrypt('missing') == ''
+
+        decrypt.assert_called_once_with(str(self.store / 'top.gpg'), 'root-id')
+
+    def test_index_persisted(self):
+        cold = self.password_store.index()
+        self.password_store.INDEXES.clear()
+
+        with mock.patch('os.scandir', side_effect=AssertionError('store walked again')):
+            warm = self.password_store.index()
+
+        assert warm == cold
+
+    def test_index_invalidated_by_changes(self):
+        self.password_store.index()
+
+        self.write('work/deep/new.gpg')
+        st = (self.store / 'work' / 'deep').stat()
+        os.utime(self.store / 'work' / 'deep', ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+        self.password_store.INDEXES.clear()
+        index = self.password_store.index()
+        assert index['new'] == (str(self.store / 'work' / 'deep' / 'new.gpg'), 'work-id')
+
+
+@unittest.skipIf(sys.platform == 'win32', 'the fake gpg is a script with a shebang')
+class FakeGpgMixin(CacheDirMixin):
+    """A fake gpg on PATH, which 'decrypts' a file by reading it and logs its invocations
+    (start, end, [files]). Files with 'broken' in their content fail to decrypt.
+    """
+    delay = 0.3
+
+    fake_gpg = dedent('''
+        #!{executable}
+        import json, os, sys, time
+        start = time.time()
+        time.sleep({delay})
+        if '--decrypt-files' in sys.argv:
+            paths = sys.argv[sys.argv.index('--decrypt-files') + 1:]
+        else:
+            paths = sys.argv[-1:]
+
+        failed = False
+        for path in paths:
+            content = open(path).read()
+            if 'broken' in content:
+                failed = True
+            elif '--decrypt-files' in sys.argv:
+                with open(path[:-len('.gpg')], 'w') as wf:
+                    wf.write(content)
+            else:
+                print(content)
+
+        with open({log!r}, 'a') as log:
+            log.write(json.dumps([start, time.time(), paths]) + '\\n')
+        sys.exit(2 if failed else 0)
+    ''').lstrip()
+
+    def setUp(self) -> None:
+        super().setUp()
+        from clima import password_store
+        self.password_store = password_store
+
+        self.tmp = tempfile.TemporaryDirectory()
+        bin_dir = Path(self.tmp.name) / 'bin'
+        bin_dir.mkdir()
+        self.log = Path(self.tmp.name) / 'gpg.log'
+        gpg = bin_dir / 'gpg'
+        gpg.write_text(self.fake_gpg.format(executable=sys.executable, delay=self.delay, log=str(self.log)))
+        gpg.chmod(0o755)
+
+        self.store = Path(self.tmp.name) / 'store'
+        self.store.mkdir()
+        (self.store / '.gpg-id').write_text('id')
+
+        mock.patch.dict(os.environ, {'PATH': f'{bin_dir}{os.pathsep}{os.environ["PATH"]}'}).start()
+        mock.patch.object(password_store, 'PW_STORE_PATH', str(self.store)).start()
+        password_store.INDEXES.clear()
+
+    def tearDown(self) -> None:
+        mock.patch.stopall()
+        self.password_store.INDEXES.clear()
+        self.tmp.cleanup()
+        super().tearDown()
+
+    def add_secret(self, name, content=None):
+        (self.store / f'{name}.gpg').write_text(content if content is not None else f'{name} secret')
+
+    def invocations(self):
+        if not self.log.exists():
+            return []
+        return [json.loads(line) for line in self.log.read_text().splitlines()]
+
+    def max_overlap(self):
+        events = sorted([(start, 1) for start, _, _ in self.invocations()]
+                        + [(end, -1) for _, end, _ in self.invocations()])
+        running = overlap = 0
+        for _, change in events:
+            running += change
+            overlap = max(overlap, running)
+        return overlap
+
+
+class TestConcurrentDecryption(FakeGpgMixin, TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        for name in 'abcd':
+            self.add_secret(name)
+        self.add_secret('broken', 'broken')
+
+    def test_sequential_by_default(self):
+        secrets = self.password_store.get_secrets_for(['a', 'b'])
+
+        assert secrets == {'a': 'a secret', 'b': 'b secret'}
+        assert self.max_overlap() == 1
+
+    def test_concurrency_limit(self):
+        with mock.patch.dict(os.environ, {'CLIMA_GPG_CONCURRENCY': '2'}):
+            secrets = self.password_store.get_secrets_for(['a', 'b', 'c', 'd', 'missing'])
+
+        assert secrets == {k: f'{k} secret' for k in 'abcd'}
+        assert self.max_overlap() == 2
+
+    def test_failure_isolated(self):
+        secrets = self.password_store.get_secrets_for(['a', 'broken', 'b'], max_workers=3)
+
+        assert secrets == {'a': 'a secret', 'broken': None, 'b': 'b secret'}
+
+    def test_missing_gpg_not_fatal(self):
+        with mock.patch.dict(os.environ, {'PATH': ''}):
+            secrets = self.password_store.get_secrets_for(['a', 'b'], max_workers=2)
+
+        assert secrets == {'a': None, 'b': None}
+
+
+class TestConcurrentSecretsLayer(FakeGpgMixin, SysArgvRestore, TestCase):
+    def setUp(self) -> None:
+        FakeGpgMixin.setUp(self)
+        SysArgvRestore.setUp(self)
+        for name in ['a', 'b', 'c', 'unused_by_schema']:
+            self.add_secret(name)
+
+        from clima import c, Schema
+        self.c = c
+
+        class C(Schema):
+            a: str = ''
+            b: str = ''
+            c: str = ''
+
+        mock.patch.dict(os.environ, {'CLIMA_GPG_CONCURRENCY': '4'}).start()
+
+    def tearDown(self) -> None:
+        SysArgvRestore.tearDown(self)
+        FakeGpgMixin.tearDown(self)
+
+    def test_needed_secrets_prefetched(self):
+        sys.argv = ['test', 'x', '--c', 'given']
+
+        @self.c
+        class Cli:
+            def x(self):
+                pass
+
+        assert self.invocations() == []
+        assert self.c.a == 'a secret'
+        assert self.c.b == 'b secret'
+        assert self.c.c == 'given'
+
+        decrypted = sorted(Path(path).stem for _, _, paths in self.invocations() for path in paths)
+        assert decrypted == ['a', 'b'], 'only the secrets not given otherwise should be decrypted'
+        assert self.max_overlap() == 2
+
+
+class TestBatchDecryption(FakeGpgMixin, TestCase):
+    delay = 0
+
+    def setUp(self) -> None:
+        super().setUp()
+        for name in 'abc':
+            self.add_secret(name)
+        self.add_secret('broken', 'broken')
+        self.runtime_dir = Path(self.tmp.name) / 'runtime'
+        self.runtime_dir.mkdir(mode=0o700)
+        mock.patch.dict(os.environ, {'CLIMA_GPG_BATCH': '1', 'XDG_RUNTIME_DIR': str(self.runtime_dir)}).start()
+
+    def test_single_gpg_process(self):
+        secrets = self.password_store.get_secrets_for(['a', 'b', 'c', 'missing'])
+
+        assert secrets == {k: f'{k} secret' for k in 'abc'}
+        assert len(self.invocations()) == 1
+
+    def test_private_runtime_dir(self):
+        self.password_store.get_secrets_for(['a', 'b'])
+
+        batch_dir = Path(self.invocations()[0][2][0]).parent
+        assert batch_dir.parent == self.runtime_dir
+        assert not batch_dir.exists(), 'the decrypted files should be removed'
+
+    def test_no_runtime_dir(self):
+        del os.environ['XDG_RUNTIME_DIR']
+        with mock.patch('tempfile.TemporaryDirectory', side_effect=AssertionError('wrote to the temp dir')):
+            secrets = self.password_store.get_secrets_for(['a', 'b'])
+
+        assert secrets == {'a': 'a secret', 'b': 'b secret'}
+        assert [len(paths) for _, _, paths in self.invocations()] == [1, 1]
+
+    def test_failed_files_decrypted_one_by_one(self):
+        secrets = self.password_store.get_secrets_for(['a', 'broken'])
+
+        assert secrets == {'a': 'a secret', 'broken': None}
+        assert [len(paths) for _, _, paths in self.invocations()] == [2, 1]
+
+    def test_fallback_when_batch_fails(self):
+        with mock.patch.object(self.password_store, 'decrypt_files', side_effect=OSError('no symlinks')):
+            secrets = self.password_store.get_secrets_for(['a', 'b'])
+
+        assert secrets == {'a': 'a secret', 'b': 'b secret'}
+        assert [len(paths) for _, _, paths in self.invocations()] == [1, 1]
+
+
+class TestAgent(FakeGpgMixin, TestCase):
+    delay = 0
+    ttl = 60
+
+    def setUp(self) -> None:
+        super().setUp()
+        import threading
+        from clima import agent
+        self.agent = agent
+
+        for name in 'ab':
+            self.add_secret(name)
+
+        self.server = agent.AgentServer(agent.new_socket_path(), ttl=self.ttl)
+        threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+        mock.patch.dict(os.environ, {agent.ENV_SOCK: self.server.server_address}).start()
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        super().tearDown()
+
+    def decrypted(self):
+        return sorted(Path(path).stem for _, _, paths in self.invocations() for path in paths)
+
+    def test_secrets_cached(self):
+        assert self.password_store.get_secrets_for(['a', 'b']) == {'a': 'a secret', 'b': 'b secret'}
+        assert self.password_store.get_secret('a') == 'a secret'
+        assert self.password_store.get_secrets_for(['b', 'a']) == {'b': 'b secret', 'a': 'a secret'}
+
+        assert self.decrypted() == ['a', 'b']
+
+    def test_changed_file_evicted(self):
+        self.password_store.get_secret('a')
+
+        path = self.store / 'a.gpg'
+        path.write_text('new a secret')
+        st = path.stat()
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+        assert self.password_store.get_secret('a') == 'new a secret'
+        assert self.decrypted() == ['a', 'a']
+
+    def test_flush(self):
+        self.password_store.get_secret('a')
+        self.agent.flush()
+        self.password_store.get_secret('a')
+
+        assert self.decrypted() == ['a', 'a']
+
+    def test_ttl(self):
+        self.server.cache.ttl = 0
+        self.password_store.get_secret('a')
+        self.password_store.get_secret('a')
+
+        assert self.decrypted() == ['a', 'a']
+
+    def test_unsupported_platform(self):
+        from clima.__main__ import main
+        with mock.patch.object(self.agent, 'is_supported', return_value=False), \
+                mock.patch.object(self.agent, 'get') as get:
+            assert self.password_store.get_secret('a') == 'a secret'
+            with self.assertRaises(OSError):
+                self.agent.start(foreground=True)
+            with mock.patch('sys.stderr', io.StringIO()) as stderr:
+                assert main(['agent']) == 1
+            assert 'POSIX' in stderr.getvalue()
+
+        assert get.call_count == 0
+
+    def test_unreachable_agent_not_fatal(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+        assert self.password_store.get_secret('a') == 'a secret'
+        assert self.decrypted() == ['a']
@@ -0,0 +1,73 @@
+import os
+import sys
+from unittest import TestCase, mock
+
+from tests import SysArgvRestore
+
+
+class TestFreeze(TestCase, SysArgvRestore):
+    def setUp(self) -> None:
+        super().setUp()
+        from clima import c, Schema
+        self.c = c
+
+        class C(Schema):
+            a: int = 1
+            b: str = 'b'
+            required: str = None
+
+        # The layers are read lazily, i.e. when frozen
+        self.env_patch = mock.patch.dict(os.environ, {'b': 'env'})
+        self.env_patch.start()
+
+        sys.argv = ['test', 'x', '--a', '2']
+
+        @c
+        class Cli:
+            def post_init(self):
+                self.extra = 'post init'
+
+            def x(self):
+                pass
+
+    def tearDown(self) -> None:
+        self.env_patch.stop()
+        super().tearDown()
+
+    def test_snapshot(self):
+        from clima import freeze
+        from clima.core import RequiredParameterException
+
+        conf = freeze()
+        assert (conf.a, conf.b, conf.extra) == (2, 'env', 'post init')
+        assert conf._asdict() == {'a': 2, 'b': 'env', 'extra': 'post init'}
+        assert conf.version == self.c.version
+        assert type(conf).__slots__ == ('a', 'b', 'required', 'extra')
+        assert not hasattr(conf, '__dict__')
+
+        with self.assertRaises(RequiredParameterException):
+            conf.required
+        with self.assertRaises(AttributeError):
+            conf.a = 3
+        with self.assertRaises(AttributeError):
+            conf.undefined
+
+    def test_class_generated_once(self):
+        from clima import freeze
+        assert type(freeze()) is type(freeze())
+
+    def test_unread_fields_resolved_on_access(self):
+        from clima import freeze, password_store
+        with mock.patch.object(password_store, 'get_secret', return_value='secret') as get_secret:
+            conf = freeze()
+            assert get_secret.call_count == 0, 'freezing should not decrypt the secrets'
+
+            assert conf.required == 'secret'
+            assert conf.required == 'secret'
+            assert get_secret.call_args_list == [mock.call('required')]
+
+    def test_not_resolved(self):
+        from clima import core, freeze
+        with mock.patch.dict(core.DECORATORS_STATE, {'schema': None}):
+            with self.assertRaises(RuntimeError):
+                freeze()
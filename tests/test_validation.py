@@ -0,0 +1,114 @@
+import enum
+import os
+import sys
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Literal, Optional, Set, Tuple, Union
+from unittest import TestCase, mock
+
+from tests import SysArgvRestore
+
+
+class Color(enum.Enum):
+    RED = 1
+    GREEN = 2
+
+
+class TestValidators(TestCase):
+    def test_containers(self):
+        from clima.validation import compile_caster
+
+        assert compile_caster(List[int])(['1', 2]) == [1, 2]
+        assert compile_caster(List[int])('3') == [3], 'a single value should be wrapped'
+        assert compile_caster(Tuple[int, ...])(('1', '2')) == (1, 2)
+        assert compile_caster(Tuple[int, str])([1, 2]) == (1, '2')
+        assert compile_caster(Set[Path])(['/tmp']) == {Path('/tmp')}
+        assert compile_caster(FrozenSet[str])('a') == frozenset({'a'})
+        assert compile_caster(Dict[str, List[float]])({'a': [1, '2.5']}) == {'a': [1.0, 2.5]}
+
+    def test_unions_and_literals(self):
+        from clima.validation import compile_caster
+
+        assert compile_caster(Optional[Path])(None) is None
+        assert compile_caster(Optional[Path])('/tmp') == Path('/tmp')
+        assert compile_caster(Union[int, str])('5') == 5
+        assert compile_caster(Union[int, str])('five') == 'five'
+        assert compile_caster(Union[str, int])(5) == 5, 'a value of a member type is kept as is'
+        assert compile_caster(Literal['dev', 'prod'])('prod') == 'prod'
+        assert compile_caster(Literal[1, 2])('2') == 2
+
+    def test_enums(self):
+        from clima.validation import compile_caster
+
+        cast = compile_caster(Color)
+        assert cast(Color.RED) is Color.RED
+        assert cast(2) is Color.GREEN
+        assert cast('GREEN') is Color.GREEN
+        assert cast('1') is Color.RED
+
+    def test_errors(self):
+        from clima.validation import ValidationError, compile_caster
+
+        cases = [
+            (List[int], [1, 'x'], "[1]: expected int, got 'x'"),
+            (Dict[str, Tuple[int, int]], {'a': (1,)}, "['a']: expected 2 items, got 1 ((1,))"),
+            (Literal['dev', 'prod'], 'test', "expected one of 'dev', 'prod', got 'test'"),
+            (Optional[int], 'x', "expected int or NoneType, got 'x'"),
+            (Color, 'BLUE', "expected one of RED, GREEN (Color), got 'BLUE'"),
+            (bool, 'maybe', "expected bool, got 'maybe'"),
+        ]
+        for annotation, value, message in cases:
+            with self.assertRaises(ValidationError) as cm:
+                compile_caster(annotation)(value)
+            assert str(cm.exception) == message
+
+    def test_cached_by_annotation(self):
+        from clima import validation
+
+        with mock.patch.object(validation, 'compile_annotation', wraps=validation.compile_annotation) as compile:
+            validation.COMPILED.pop(List[Tuple[int, str]], None)
+            validation.compile_caster(List[Tuple[int, str]])
+            compiled = compile.call_count
+            validation.compile_caster(List[Tuple[int, str]])
+
+        assert compiled > 0 and compile.call_count == compiled
+
+
+class TestSchemaValidation(TestCase, SysArgvRestore):
+    def test_schema(self):
+        from clima import c, Schema
+
+        class C(Schema):
+            ports: List[int] = [80]
+            mode: Literal['dev', 'prod'] = 'dev'
+            color: Color = 'RED'
+            root: Optional[Path] = None
+
+        assert C.color is Color.RED
+
+        sys.argv = ['test', 'x', '--root', '/tmp']
+        with mock.patch.dict(os.environ, {'ports': '8080', 'mode': 'prod'}):
+            @c
+            class Cli:
+                def x(self):
+                    pass
+
+            assert (c.ports, c.mode, c.color, c.root) == ([8080], 'prod', Color.RED, Path('/tmp'))
+
+    def test_error_names_the_field(self):
+        from clima import c, Schema
+        from clima.validation import ValidationError
+
+        class C(Schema):
+            ports: List[int] = [80]
+
+        sys.argv = ['test', 'x']
+        with mock.patch.dict(os.environ, {'ports': 'http'}):
+            @c
+            class Cli:
+                def x(self):
+                    pass
+
+            with self.assertRaises(ValidationError) as cm:
+                c.ports
+
+        assert str(cm.exception) == "ports[0]: expected int, got 'http'"